@@ -0,0 +1,163 @@
+# admission.py
+"""
+Admission control for upstream-bound API requests.
+
+Only the views listed in ``ADMISSION_CONTROLLED_VIEWS`` are controlled, and
+distance requests already answered by the cache always pass (fast lane).
+Everything else is subject to:
+
+- an optional cap (``ADMISSION_MAX_IN_FLIGHT``, off by default) on in-flight
+  upstream-bound requests, counted in the shared cache so it spans all
+  workers; size it for the whole deployment, not one worker,
+- CoDel-style shedding on queue delay (time spent before a worker picked the
+  request up, from the load balancer's ``X-Request-Start`` header): once the
+  delay has stayed above ``ADMISSION_TARGET_DELAY`` for a whole
+  ``ADMISSION_INTERVAL``, requests are shed at an increasing rate until it
+  drops below the target again.
+
+Clients are prioritized by API key (``API_KEYS`` maps keys to 'high',
+'normal' or 'low'): high priority is never shed on queue delay, low priority
+is shed as soon as the delay exceeds the target and only gets half of the
+in-flight slots.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIORITIES = ('high', 'normal', 'low')
+IN_FLIGHT_KEY = 'admission:in_flight'
+
+
+def queue_delay(request):
+    """
+    Seconds between the load balancer receiving the request and now, from an
+    ``X-Request-Start`` header in seconds, milliseconds or microseconds
+    (optionally prefixed with ``t=``). 0 when the header is absent or invalid.
+    """
+    header = request.META.get('HTTP_X_REQUEST_START', '')
+    try:
+        started = float(header.strip().removeprefix('t='))
+    except ValueError:
+        return 0.0
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(time.time() - started, 0.0)
+
+
+def client_priority(request):
+    priority = settings.API_KEYS.get(request.META.get('HTTP_X_API_KEY'), settings.ADMISSION_DEFAULT_PRIORITY)
+    return priority if priority in PRIORITIES else settings.ADMISSION_DEFAULT_PRIORITY
+
+
+class CoDel:
+    """
+    CoDel (controlled delay) control law applied to request queue delay.
+    State is per worker; each worker sees the delay of the requests it takes.
+    """
+
+    def __init__(self, target, interval):
+        self.target = target
+        self.interval = interval
+        self._lock = threading.Lock()
+        self.first_above = None
+        self.dropping = False
+        self.drop_next = 0.0
+        self.count = 0
+
+    def should_shed(self, delay, now=None):
+        """Record a request's queue ``delay`` and return True if it should be shed."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if delay < self.target:
+                self.first_above = None
+                self.dropping = False
+                return False
+            if self.first_above is None:
+                self.first_above = now + self.interval
+                return False
+            if now < self.first_above:
+                return False
+
+            if not self.dropping:
+                self.dropping = True
+                # Resume near the previous drop rate if we were dropping recently.
+                self.count = max(self.count - 2, 1) if now - self.drop_next < 8 * self.interval else 1
+                self.drop_next = now + self.interval / math.sqrt(self.count)
+                return True
+            if now >= self.drop_next:
+                self.count += 1
+                self.drop_next += self.interval / math.sqrt(self.count)
+                return True
+            return False
+
+
+class InFlight:
+    """Count of in-flight upstream-bound requests, shared through the cache."""
+
+    def __init__(self, key=IN_FLIGHT_KEY):
+        self.key = key
+
+    def count(self):
+        return cache.get(self.key, 0)
+
+    def acquire(self, limit):
+        """Take a slot if fewer than ``limit`` are in use. Returns True if taken."""
+        # The key expires ADMISSION_IN_FLIGHT_TTL after the last acquire, so that
+        # slots leaked by killed workers are recovered once traffic pauses.
+        cache.add(self.key, 0, timeout=settings.ADMISSION_IN_FLIGHT_TTL)
+        try:
+            in_flight = cache.incr(self.key)
+        except ValueError:
+            cache.set(self.key, 1, timeout=settings.ADMISSION_IN_FLIGHT_TTL)
+            in_flight = 1
+        else:
+            cache.touch(self.key, timeout=settings.ADMISSION_IN_FLIGHT_TTL)
+        if in_flight > limit:
+            self.release()
+            return False
+        return True
+
+    def release(self):
+        try:
+            # Slots taken before the key expired are released into the new count;
+            # undo instead of going negative, which would admit past the limit.
+            if cache.decr(self.key) < 0:
+                cache.incr(self.key)
+        except ValueError:
+            pass
+
+
+def in_flight_limit(priority):
+    limit = settings.ADMISSION_MAX_IN_FLIGHT
+    if limit is None or priority == 'high':
+        return math.inf
+    if priority == 'low':
+        return max(limit // 2, 1)
+    return limit
+
+
+codel = CoDel(settings.ADMISSION_TARGET_DELAY, settings.ADMISSION_INTERVAL)
+in_flight = InFlight()
+
+
+def admit(request):
+    """
+    Decide whether a controlled request may run. Returns True when it took an
+    in-flight slot (to be released with ``in_flight.release()``), False when
+    it should be shed.
+    """
+    priority = client_priority(request)
+    delay = queue_delay(request)
+    shed = codel.should_shed(delay)
+    if priority == 'low' and delay >= settings.ADMISSION_TARGET_DELAY:
+        shed = True
+    elif priority == 'high':
+        shed = False
+    if shed:
+        return False
+    return in_flight.acquire(in_flight_limit(priority))
@@ -0,0 +1,163 @@
+# analytics.py
+"""
+Incremental usage counters.
+
+Each worker counts requests, cache hits/misses and upstream calls per day,
+and tracks its hottest location pairs and locations with a Space-Saving
+top-K sketch. Every ``ANALYTICS_FLUSH_INTERVAL`` seconds, and when a worker
+or a management command that calls the Maps API exits, the counts gathered
+since the previous flush are added to ``DailyUsage``, ``PairUsage`` and
+``Location.popularity`` (which also ranks autocomplete suggestions), so the
+stats endpoints read a few indexed rows instead of scanning ``DistanceRecord``.
+Only the guaranteed part of each sketch count is added, so the stored
+counts are lower bounds.
+"""
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from operator import itemgetter
+
+from django.conf import settings
+from django.db import DatabaseError, connections, router, transaction
+from django.utils import timezone
+
+from .models import DailyUsage, Location, PairUsage
+
+logger = logging.getLogger(__name__)
+
+DAILY_FIELDS = ('requests', 'cache_hits', 'cache_misses', 'upstream_calls')
+
+
+class SpaceSaving:
+    """
+    Space-Saving heavy hitters sketch: keeps at most ``capacity`` keys; a new
+    key replaces the smallest one and inherits its count, which is recorded
+    as the key's error. ``counts`` are over-estimates by at most that error;
+    ``guaranteed`` gives the lower bounds.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def add(self, key, count=1):
+        if key in self.counts:
+            self.counts[key] += count
+        elif len(self.counts) < self.capacity:
+            self.counts[key] = count
+            self.errors[key] = 0
+        else:
+            victim = min(self.counts, key=self.counts.__getitem__)
+            self.errors.pop(victim)
+            self.errors[key] = self.counts.pop(victim)
+            self.counts[key] = self.errors[key] + count
+
+    def top(self, k):
+        return heapq.nlargest(k, self.counts.items(), key=itemgetter(1))
+
+    def guaranteed(self):
+        """{key: count - error}: occurrences certainly seen, for the keys with any."""
+        counts = {key: count - self.errors[key] for key, count in self.counts.items()}
+        return {key: count for key, count in counts.items() if count > 0}
+
+
+class UsageTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.flushed_at = time.monotonic()
+
+    def _reset(self):
+        self.pairs = SpaceSaving(settings.ANALYTICS_SKETCH_CAPACITY)
+        self.locations = SpaceSaving(settings.ANALYTICS_SKETCH_CAPACITY)
+        self.daily = Counter()
+
+    def record_request(self, cache_hit, pair=None):
+        """Count a served distance request for the (start_id, end_id) ``pair``."""
+        day = timezone.now().date()
+        with self._lock:
+            self.daily[day, 'requests'] += 1
+            self.daily[day, 'cache_hits' if cache_hit else 'cache_misses'] += 1
+            if pair is not None:
+                self.pairs.add(tuple(pair))
+                for location_id in set(pair):
+                    self.locations.add(location_id)
+        self.maybe_flush()
+
+    def record_upstream_call(self):
+        with self._lock:
+            self.daily[timezone.now().date(), 'upstream_calls'] += 1
+
+    def maybe_flush(self):
+        if time.monotonic() - self.flushed_at >= settings.ANALYTICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """Add the counts gathered since the last flush to the database."""
+        with self._lock:
+            pairs, locations, daily = self.pairs, self.locations, self.daily
+            self._reset()
+            self.flushed_at = time.monotonic()
+        if not daily:
+            # Every request and upstream call is counted per day: nothing to add.
+            return
+        try:
+            _merge(pairs, locations, daily)
+        except DatabaseError:
+            # Analytics must never fail a request; these counts are lost.
+            logger.exception("Could not flush usage counters")
+
+
+def _merge(pairs, locations, daily):
+    days = {}
+    for (day, field), count in daily.items():
+        days.setdefault(day, dict.fromkeys(DAILY_FIELDS, 0))[field] = count
+    pair_counts, location_counts = pairs.guaranteed(), locations.guaranteed()
+
+    using = router.db_for_write(DailyUsage)
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        # Skip pairs with locations deleted since they were counted
+        known = set(Location.objects.using(using).filter(
+            pk__in={location_id for pair in pair_counts for location_id in pair}
+        ).values_list('pk', flat=True))
+        # Every statement below writes its rows in key order, so that concurrent
+        # flushes from other workers lock them in the same order and can't deadlock.
+        pair_rows = [
+            (start_id, end_id, count) for (start_id, end_id), count in sorted(pair_counts.items())
+            if start_id in known and end_id in known
+        ]
+
+        if days:
+            cursor.executemany(
+                f"""
+                INSERT INTO {DailyUsage._meta.db_table} (day, {', '.join(DAILY_FIELDS)})
+                VALUES (%s, {', '.join(['%s'] * len(DAILY_FIELDS))})
+                ON CONFLICT (day) DO UPDATE SET
+                """ + ', '.join(f"{field} = {DailyUsage._meta.db_table}.{field} + EXCLUDED.{field}"
+                                for field in DAILY_FIELDS),
+                [(day, *(counts[field] for field in DAILY_FIELDS)) for day, counts in sorted(days.items())],
+            )
+        if pair_rows:
+            cursor.executemany(
+                f"""
+                INSERT INTO {PairUsage._meta.db_table} (start_location_id, end_location_id, requests)
+                VALUES (%s, %s, %s)
+                ON CONFLICT (start_location_id, end_location_id) DO UPDATE SET
+                    requests = {PairUsage._meta.db_table}.requests + EXCLUDED.requests
+                """,
+                pair_rows,
+            )
+        if location_counts:
+            cursor.executemany(
+                f"UPDATE {Location._meta.db_table} SET popularity = popularity + %s WHERE id = %s",
+                [(count, location_id) for location_id, count in sorted(location_counts.items())],
+            )
+
+
+tracker = UsageTracker()
@@ -0,0 +1,82 @@
+# db.py
+"""
+Server-side prepared statements for the two fixed-shape queries on the
+request path: the fuzzy ``Location`` lookup and the ``DistanceRecord`` insert.
+
+Each is prepared on its first use in a connection (see ``run_prepared``), not
+on connect, so that connections opened before the tables exist (``migrate``,
+test database setup) are unaffected. A statement PostgreSQL rejects because a
+migration changed the type of a column it returns ("cached plan must not
+change result type") is prepared again, so no restart is needed. They only pay
+off with persistent connections (``CONN_MAX_AGE``) and must stay disabled
+behind PgBouncer in transaction mode.
+"""
+from django.db import DatabaseError
+
+FIND_LOCATION = 'distance_find_location'
+INSERT_DISTANCE_RECORD = 'distance_insert_record'
+
+PREPARED_STATEMENTS = {
+    # Mirrors the ORM query in DistanceService.find_location.
+    FIND_LOCATION: """
+        PREPARE distance_find_location (text) AS
+        SELECT id, name, address, latitude, longitude
+        FROM distance_location
+        WHERE similarity(name, $1) + similarity(address, $1) > 0.3
+        ORDER BY
+            similarity(name, $1) + similarity(address, $1) DESC,
+            ts_rank(
+                setweight(to_tsvector(COALESCE(name, '')), 'A') ||
+                setweight(to_tsvector(COALESCE(address, '')), 'B'),
+                plainto_tsquery($1)
+            ) DESC
+        LIMIT 1
+    """,
+    INSERT_DISTANCE_RECORD: """
+        PREPARE distance_insert_record AS
+        INSERT INTO distance_distancerecord
+            (start_location_id, end_location_id, distance_km, created_at)
+        VALUES ($1, $2, $3, $4)
+    """,
+}
+
+EXECUTE_FIND_LOCATION = f"EXECUTE {FIND_LOCATION}(%s)"
+EXECUTE_INSERT_DISTANCE_RECORD = f"EXECUTE {INSERT_DISTANCE_RECORD}(%s, %s, %s, %s)"
+
+
+def prepare(connection, name):
+    """Prepare statement ``name`` on ``connection`` unless this session already has it."""
+    connection.ensure_connection()
+    prepared = connection.__dict__.setdefault('prepared_statements', set())
+    if name not in prepared:
+        with connection.cursor() as cursor:
+            cursor.execute(PREPARED_STATEMENTS[name])
+        prepared.add(name)
+
+
+STALE_PLAN = 'cached plan must not change result type'
+
+
+def run_prepared(connection, name, run):
+    """
+    Prepare statement ``name`` on ``connection`` if needed and return
+    ``run()``, which executes it. Re-prepares and runs it once more when
+    its plan is stale.
+    """
+    prepare(connection, name)
+    # Inside a transaction a failed statement would abort it; keep that to a savepoint.
+    savepoint = connection.savepoint() if connection.in_atomic_block else None
+    try:
+        result = run()
+    except DatabaseError as e:
+        if savepoint:
+            connection.savepoint_rollback(savepoint)
+        if STALE_PLAN not in str(e):
+            raise
+        with connection.cursor() as cursor:
+            cursor.execute(f"DEALLOCATE {name}")
+            cursor.execute(PREPARED_STATEMENTS[name])
+        return run()
+    if savepoint:
+        connection.savepoint_commit(savepoint)
+    return result
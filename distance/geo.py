@@ -0,0 +1,154 @@
+# geo.py
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class Coordinates:
+    """A resolved (lat, lng) pair in degrees, unpackable as a tuple."""
+    __slots__ = ('lat', 'lng')
+
+    def __init__(self, lat, lng):
+        self.lat = float(lat)
+        self.lng = float(lng)
+
+    def __iter__(self):
+        yield self.lat
+        yield self.lng
+
+    def __eq__(self, other):
+        if not isinstance(other, Coordinates):
+            return NotImplemented
+        return self.lat == other.lat and self.lng == other.lng
+
+    def __hash__(self):
+        return hash((self.lat, self.lng))
+
+    def __repr__(self):
+        return f"Coordinates({self.lat!r}, {self.lng!r})"
+
+    def __str__(self):
+        # "lat,lng" with microdegree precision, as the Maps APIs expect
+        return f"{self.lat:.6f},{self.lng:.6f}"
+
+    def as_dict(self):
+        return {"latitude": self.lat, "longitude": self.lng}
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometers."""
+    lat1, lng1, lat2, lng2 = map(math.radians, map(float, (lat1, lng1, lat2, lng2)))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2 +
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+
+def geodesic_km(lat1, lng1, lat2, lng2):
+    """
+    Ellipsoidal (WGS84) distance in kilometers using Vincenty's inverse
+    formula; falls back to the great-circle distance for nearly antipodal
+    points where the iteration does not converge.
+    """
+    lat1, lng1, lat2, lng2 = map(float, (lat1, lng1, lat2, lng2))
+    if lat1 == lat2 and lng1 == lng2:
+        return 0.0
+    u1 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat1)))
+    u2 = math.atan((1 - WGS84_F) * math.tan(math.radians(lat2)))
+    sin_u1, cos_u1 = math.sin(u1), math.cos(u1)
+    sin_u2, cos_u2 = math.sin(u2), math.cos(u2)
+    delta_lng = math.radians(lng2 - lng1)
+    lam = delta_lng
+    for _ in range(100):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+        sin_sigma = math.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+        if sin_sigma == 0:
+            return 0.0
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        cos_2sigma_m = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha if cos2_alpha else 0.0
+        c = WGS84_F / 16 * cos2_alpha * (4 + WGS84_F * (4 - 3 * cos2_alpha))
+        previous, lam = lam, delta_lng + (1 - c) * WGS84_F * sin_alpha * (
+            sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+        )
+        if abs(lam - previous) < 1e-12:
+            break
+    else:
+        return haversine_km(lat1, lng1, lat2, lng2)
+
+    u_sq = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+    a = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    b = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = b * sin_sigma * (cos_2sigma_m + b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+        b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)
+    ))
+    return WGS84_B * a * (sigma - delta_sigma) / 1000.0
+
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_MAX_PRECISION = 12
+
+
+def geohash_encode(lat, lng, precision=GEOHASH_MAX_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    lat, lng = float(lat), float(lng)
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        interval, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """(height, width) of a geohash cell in degrees."""
+    lng_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def geohash_cells_covering(lat, lng, radius_km):
+    """
+    Geohash prefixes whose cells together cover the circle of ``radius_km``
+    around the point: the point's cell and its 8 neighbours, at the finest
+    precision whose cells are at least ``radius_km`` across. Returns an
+    empty list when the circle is too large for that (search everything).
+    """
+    lat, lng = float(lat), float(lng)
+    for precision in range(GEOHASH_MAX_PRECISION, 0, -1):
+        height, width = geohash_cell_size(precision)
+        height_km = height * 111.0
+        width_km = width * 111.0 * math.cos(math.radians(min(abs(lat) + height, 90.0)))
+        if height_km >= radius_km and width_km >= radius_km:
+            break
+    else:
+        return []
+    if precision < 2:
+        return []
+    cells = set()
+    for dlat in (-height, 0.0, height):
+        for dlng in (-width, 0.0, width):
+            cell_lat = max(-90.0, min(90.0, lat + dlat))
+            cell_lng = (lng + dlng + 180.0) % 360.0 - 180.0
+            cells.add(geohash_encode(cell_lat, cell_lng, precision))
+    return sorted(cells)
@@ -0,0 +1,280 @@
+# location_index.py
+"""
+Read-only, memory-mapped snapshot of ``Location`` used to resolve exact and
+near-exact address matches without a database round-trip.
+
+The snapshot file holds, as flat native-endian arrays:
+
+- ids (int64), latitudes and longitudes (int32 microdegrees),
+- normalized names and formatted addresses (offsets + UTF-8 blobs),
+- a trigram inverted index: sorted trigram hashes, posting offsets and
+  postings (row numbers), plus the trigram count of every name.
+
+Every worker maps the same file with ``mmap``, so the pages are shared by
+the whole host. ``build_snapshot`` rewrites the file atomically, adding the
+rows created since the previous snapshot, or rebuilding it when a row it
+holds was updated or deleted (detected with a checksum of those rows kept
+in the header); readers pick the new file up on their next reload check.
+"""
+import mmap
+import os
+import re
+import struct
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Max
+
+from .models import Location
+
+MAGIC = b'DLOCIDX2'
+# magic, rows, trigrams, postings, names size, addresses size, max id, checksum
+HEADER = struct.Struct('<8sIIIIIqq')
+MICRODEGREES = 1_000_000
+
+_WORD = re.compile(r'[^\W_]+')
+
+
+def normalize(text):
+    return text.strip().lower()
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: per word, padded with two leading and one trailing space."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def trigram_keys(text):
+    return sorted({zlib.crc32(gram.encode()) for gram in trigrams(text)})
+
+
+def _padded(data):
+    return data + b'\0' * (-len(data) % 8)
+
+
+def write_snapshot(path, rows, max_id=None, checksum=0):
+    """
+    Write ``rows`` of (id, name, address, latitude, longitude) to ``path``
+    atomically, with the ``checksum`` of the table up to ``max_id`` (default:
+    the largest id in ``rows``).
+    """
+    ids, lats, lngs, gram_counts = array('q'), array('i'), array('i'), array('I')
+    name_offsets, address_offsets = array('I', [0]), array('I', [0])
+    names, addresses = bytearray(), bytearray()
+    postings_by_key = defaultdict(list)
+
+    for row, (location_id, name, address, lat, lng) in enumerate(rows):
+        name = normalize(name)
+        keys = trigram_keys(name)
+        ids.append(location_id)
+        lats.append(round(float(lat) * MICRODEGREES))
+        lngs.append(round(float(lng) * MICRODEGREES))
+        gram_counts.append(len(keys))
+        names += name.encode()
+        name_offsets.append(len(names))
+        addresses += address.encode()
+        address_offsets.append(len(addresses))
+        for key in keys:
+            postings_by_key[key].append(row)
+
+    keys = array('I', sorted(postings_by_key))
+    posting_offsets, postings = array('I', [0]), array('I')
+    for key in keys:
+        postings.extend(postings_by_key[key])
+        posting_offsets.append(len(postings))
+
+    if max_id is None:
+        max_id = max(ids, default=0)
+    header = HEADER.pack(MAGIC, len(ids), len(keys), len(postings),
+                         len(names), len(addresses), max_id, checksum)
+    sections = [header, ids, lats, lngs, gram_counts, name_offsets, address_offsets,
+                keys, posting_offsets, postings, bytes(names), bytes(addresses)]
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as snapshot_file:
+        for section in sections:
+            data = section if isinstance(section, bytes) else section.tobytes()
+            snapshot_file.write(_padded(data))
+    os.replace(tmp_path, path)
+
+
+class LocationIndex:
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot_file:
+            self.stat = os.fstat(snapshot_file.fileno())
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        magic, count, key_count, posting_count, names_size, addresses_size, self.max_id, self.checksum = (
+            HEADER.unpack_from(view)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a location index snapshot")
+        self.count = count
+
+        offset = len(_padded(bytes(HEADER.size)))
+
+        def take(fmt, length, itemsize):
+            nonlocal offset
+            size = length * itemsize
+            section = view[offset:offset + size]
+            offset += size + (-size % 8)
+            return section.cast(fmt) if fmt else section
+
+        self.ids = take('q', count, 8)
+        self.latitudes = take('i', count, 4)
+        self.longitudes = take('i', count, 4)
+        self.gram_counts = take('I', count, 4)
+        self.name_offsets = take('I', count + 1, 4)
+        self.address_offsets = take('I', count + 1, 4)
+        self.keys = take('I', key_count, 4)
+        self.posting_offsets = take('I', key_count + 1, 4)
+        self.postings = take('I', posting_count, 4)
+        self.names = take(None, names_size, 1)
+        self.addresses = take(None, addresses_size, 1)
+
+    def __len__(self):
+        return self.count
+
+    def _name(self, row):
+        return bytes(self.names[self.name_offsets[row]:self.name_offsets[row + 1]]).decode()
+
+    def _address(self, row):
+        return bytes(self.addresses[self.address_offsets[row]:self.address_offsets[row + 1]]).decode()
+
+    def _location(self, row):
+        location = Location(
+            id=self.ids[row],
+            name=self._name(row),
+            address=self._address(row),
+            latitude=self.latitudes[row] / MICRODEGREES,
+            longitude=self.longitudes[row] / MICRODEGREES,
+        )
+        location._state.adding = False
+        location._state.db = 'default'
+        # May have been deleted since the snapshot was built; see DistanceService.deleted_ids
+        location.from_snapshot = True
+        return location
+
+    def rows(self):
+        for row in range(self.count):
+            yield (self.ids[row], self._name(row), self._address(row),
+                   self.latitudes[row] / MICRODEGREES, self.longitudes[row] / MICRODEGREES)
+
+    def lookup(self, query, min_similarity):
+        """
+        Return the ``Location`` whose name best matches ``query`` by trigram
+        similarity, if it reaches ``min_similarity``; exact matches win.
+        """
+        query = normalize(query)
+        query_keys = trigram_keys(query)
+        if not query_keys:
+            return None
+
+        shared = Counter()
+        for key in query_keys:
+            i = bisect_left(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key:
+                shared.update(self.postings[self.posting_offsets[i]:self.posting_offsets[i + 1]])
+
+        best_row, best_similarity = None, 0.0
+        for row, common in shared.items():
+            similarity = common / (len(query_keys) + self.gram_counts[row] - common)
+            if similarity == 1.0 and self._name(row) == query:
+                return self._location(row)
+            if similarity > best_similarity:
+                best_row, best_similarity = row, similarity
+        if best_row is None or best_similarity < min_similarity:
+            return None
+        return self._location(best_row)
+
+    def close(self):
+        for section in (self.ids, self.latitudes, self.longitudes, self.gram_counts,
+                        self.name_offsets, self.address_offsets, self.keys,
+                        self.posting_offsets, self.postings, self.names, self.addresses):
+            section.release()
+        self._mmap.close()
+
+
+CHECKSUM_SQL = f"""
+    SELECT COALESCE(SUM(hashtext(concat_ws('|', id, name, address, latitude, longitude))::bigint), 0)::bigint
+    FROM {Location._meta.db_table}
+    WHERE id <= %s
+"""
+
+
+def table_checksum(using, max_id):
+    """Checksum of the ``Location`` rows up to ``max_id``; changes when any of them is updated or deleted."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(CHECKSUM_SQL, [max_id])
+        return cursor.fetchone()[0]
+
+
+def build_snapshot(path, full=False):
+    """
+    Add the locations created since the snapshot at ``path`` was written and
+    rewrite it. Everything is reloaded when ``full``, or when rows already in
+    the snapshot have been updated or deleted since. Returns the row count.
+    """
+    using = router.db_for_read(Location)
+    locations = Location.objects.using(using)
+    max_id = locations.aggregate(max_id=Max('id'))['max_id'] or 0
+    # Taken before the rows are read: a row changed in between makes the next build a full one.
+    checksum = table_checksum(using, max_id)
+
+    rows, known_id = [], 0
+    if not full and os.path.exists(path):
+        try:
+            existing = LocationIndex(path)
+        except ValueError:
+            existing = None  # Written by an older version
+        if existing is not None:
+            if existing.max_id <= max_id and table_checksum(using, existing.max_id) == existing.checksum:
+                rows, known_id = list(existing.rows()), existing.max_id
+            existing.close()
+
+    new_rows = (
+        locations.filter(id__gt=known_id, id__lte=max_id).order_by('id')
+        .values_list('id', 'name', 'address', 'latitude', 'longitude')
+        .iterator(chunk_size=5000)
+    )
+    rows.extend(new_rows)
+    write_snapshot(path, rows, max_id, checksum)
+    return len(rows)
+
+
+_current = {'index': None, 'checked_at': 0.0}
+
+
+def get_location_index():
+    """
+    The mapped snapshot at ``LOCATION_INDEX_PATH``, remapped when the file has
+    been replaced. None when the index is disabled or not built yet.
+    """
+    path = settings.LOCATION_INDEX_PATH
+    if not path:
+        return None
+    now = time.monotonic()
+    index = _current['index']
+    if index is not None and now - _current['checked_at'] < settings.LOCATION_INDEX_RELOAD_INTERVAL:
+        return index
+    _current['checked_at'] = now
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return index
+    if index is None or (stat.st_ino, stat.st_mtime_ns) != (index.stat.st_ino, index.stat.st_mtime_ns):
+        # The old mapping is left to the garbage collector: other threads
+        # may still be reading from it.
+        _current['index'] = LocationIndex(path)
+    return _current['index']
@@ -0,0 +1,35 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from distance.location_index import build_snapshot
+
+
+class Command(BaseCommand):
+    help = "Build or incrementally refresh the memory-mapped location index snapshot."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.LOCATION_INDEX_PATH,
+                            help="Snapshot file (defaults to LOCATION_INDEX_PATH).")
+        parser.add_argument('--full', action='store_true',
+                            help="Rebuild from every location instead of adding new rows only.")
+        parser.add_argument('--interval', type=int, default=0,
+                            help="Keep running and refresh every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not path:
+            raise CommandError("No snapshot path: pass --path or set LOCATION_INDEX_PATH.")
+
+        full = options['full']
+        while True:
+            started = time.monotonic()
+            count = build_snapshot(path, full=full)
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {count} locations to {path} in {time.monotonic() - started:.2f}s"
+            ))
+            if not options['interval']:
+                break
+            full = False
+            time.sleep(options['interval'])
@@ -0,0 +1,137 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from distance.analytics import tracker as usage
+from distance.models import Location
+from distance.resilience import RateLimiter
+from distance.services import BulkGeocodeService
+
+
+class Command(BaseCommand):
+    help = (
+        "Geocode (or re-geocode) the selected locations concurrently at a capped "
+        "rate, saving progress to a checkpoint file so interrupted runs resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Select every location.")
+        parser.add_argument('--ids', help="Comma-separated location ids.")
+        parser.add_argument('--missing-coordinates', action='store_true',
+                            help="Select locations stored without coordinates (0, 0).")
+        parser.add_argument('--address-contains', help="Select locations whose address contains this text.")
+        parser.add_argument('--source', choices=['name', 'address'], default='name',
+                            help="Field sent to the geocoder (default: the original query, name).")
+        parser.add_argument('--qps', type=float, default=settings.GEOCODE_BULK_QPS,
+                            help="Upstream calls per second, leaving the rest of the quota to live traffic.")
+        parser.add_argument('--workers', type=int, default=settings.GEOCODE_BULK_WORKERS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--checkpoint', default='geocode_locations.checkpoint',
+                            help="File recording the last location id written and the ids that failed.")
+        parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint.")
+
+    def selection(self, options):
+        conditions = Q()
+        if options['ids']:
+            try:
+                conditions &= Q(pk__in=[int(pk) for pk in options['ids'].split(',')])
+            except ValueError:
+                raise CommandError("--ids must be comma-separated integers.")
+        if options['missing_coordinates']:
+            conditions &= Q(latitude=0, longitude=0)
+        if options['address_contains']:
+            conditions &= Q(address__icontains=options['address_contains'])
+        if not conditions and not options['all']:
+            raise CommandError("Select locations with --ids, --missing-coordinates, --address-contains or --all.")
+        return conditions
+
+    def read_checkpoint(self, path, run):
+        if not os.path.exists(path):
+            return 0, []
+        with open(path) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        if checkpoint['run'] != run:
+            raise CommandError(
+                f"{path} belongs to a run with other options; pass --restart or another --checkpoint."
+            )
+        return checkpoint['last_id'], checkpoint.get('failed', [])
+
+    def write_checkpoint(self, path, run, last_id, failed):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as checkpoint_file:
+            json.dump({'run': run, 'last_id': last_id, 'failed': failed}, checkpoint_file)
+        os.replace(tmp_path, path)
+
+    def geocode_batch(self, batch, limiter, options):
+        """Geocode and save ``batch``. Returns the ids of the locations that failed."""
+        results = BulkGeocodeService.geocode(batch, limiter, options['workers'], source=options['source'])
+        BulkGeocodeService.apply(batch, results)
+        return [location.pk for location, (formatted_address, _, _) in zip(batch, results) if not formatted_address]
+
+    def handle(self, *args, **options):
+        try:
+            self.geocode_selection(options)
+        finally:
+            # Upstream calls count against the same daily quota as live traffic,
+            # also when the run is interrupted.
+            usage.flush()
+
+    def geocode_selection(self, options):
+        conditions = self.selection(options)
+        path = options['checkpoint']
+        batch_size = options['batch_size']
+        # Options that change which rows are selected or how they are geocoded
+        run = {key: options[key] for key in ('all', 'ids', 'missing_coordinates', 'address_contains', 'source')}
+        last_id, failed = (0, []) if options['restart'] else self.read_checkpoint(path, run)
+        if last_id:
+            self.stdout.write(f"Resuming after location {last_id}, {len(failed)} failed locations to retry")
+
+        queryset = Location.objects.filter(conditions).order_by('pk')
+        limiter = RateLimiter(options['qps'])
+        started = time.monotonic()
+        processed = updated = 0
+        while True:
+            batch = list(queryset.filter(pk__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            batch_failed = self.geocode_batch(batch, limiter, options)
+            processed += len(batch)
+            updated += len(batch) - len(batch_failed)
+            # The checkpoint moves past failed rows but keeps their ids for the retry pass.
+            failed += batch_failed
+            last_id = batch[-1].pk
+            self.write_checkpoint(path, run, last_id, failed)
+            usage.maybe_flush()
+            elapsed = max(time.monotonic() - started, 0.001)
+            self.stdout.write(f"{processed} geocoded, {updated} updated ({processed / elapsed:.1f}/s)")
+
+        # Most failures are transient (timeouts, an open breaker): retry each once.
+        if failed:
+            self.stdout.write(f"Retrying {len(failed)} failed locations")
+            still_failed = []
+            for start in range(0, len(failed), batch_size):
+                batch = list(queryset.filter(pk__in=failed[start:start + batch_size]))
+                if batch:
+                    batch_failed = self.geocode_batch(batch, limiter, options)
+                    updated += len(batch) - len(batch_failed)
+                    still_failed += batch_failed
+                self.write_checkpoint(path, run, last_id, still_failed + failed[start + batch_size:])
+            failed = still_failed
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Geocoded {processed} locations and updated {updated} in {time.monotonic() - started:.2f}s"
+        ))
+        if failed:
+            # The checkpoint is kept: running again with the same options retries these.
+            self.stdout.write(self.style.WARNING(
+                f"{len(failed)} locations could not be geocoded and were left unchanged: "
+                f"{','.join(map(str, failed))}"
+            ))
+        elif os.path.exists(path):
+            os.remove(path)
+        if updated and settings.LOCATION_INDEX_PATH:
+            self.stdout.write("Run `manage.py build_location_index` to refresh the location index.")
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from distance.partitions import drop_expired_partitions, ensure_partitions, rollup
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming DistanceRecord partitions, refresh the daily rollups "
+        "and drop partitions past the retention period. Run daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=settings.DISTANCE_RECORD_PARTITIONS_AHEAD)
+        parser.add_argument('--retention-months', type=int, default=settings.DISTANCE_RECORD_RETENTION_MONTHS)
+
+    def handle(self, *args, **options):
+        for month in ensure_partitions(options['months_ahead']):
+            self.stdout.write(f"Created partition for {month:%Y-%m}")
+
+        self.stdout.write(f"Wrote {rollup()} daily rollup rows")
+
+        if options['retention_months']:
+            for month in drop_expired_partitions(options['retention_months']):
+                self.stdout.write(f"Dropped partition for {month:%Y-%m}")
+        self.stdout.write(self.style.SUCCESS("Distance records maintained"))
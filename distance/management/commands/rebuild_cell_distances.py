@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from distance.services import ApproxDistanceService
+
+
+class Command(BaseCommand):
+    help = "Learn approximate-distance ratios between geohash cells from new distance records."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help="Discard the table and relearn from every distance record.")
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        processed = ApproxDistanceService.rebuild(full=options['full'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Learned from {processed} distance records in {time.monotonic() - started:.2f}s"
+        ))
@@ -0,0 +1,73 @@
+# middleware.py
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+from . import admission
+from .routers import unpin
+from .views import cached_distance, error_response
+
+
+class ReplicaPinningMiddleware:
+    """Start every request with reads allowed on the replicas again."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        unpin()
+        try:
+            return self.get_response(request)
+        finally:
+            unpin()
+
+
+class ApiKeyMiddleware:
+    """
+    With API_KEY_REQUIRED, reject /api/ requests whose X-API-Key is not one of
+    API_KEYS. A single dict lookup, so it is cheap enough for the hot path.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (settings.API_KEY_REQUIRED and request.path_info.startswith(settings.API_PATH_PREFIX)
+                and request.META.get('HTTP_X_API_KEY') not in settings.API_KEYS):
+            return error_response("UNAUTHORIZED", "A valid X-API-Key header is required.", status=401)
+        return self.get_response(request)
+
+
+class AdmissionControlMiddleware:
+    """
+    Shed upstream-bound requests with 503 + Retry-After under overload, so
+    cache hits and cheap requests keep being served (see distance/admission.py).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self._controlled(request):
+            return self.get_response(request)
+
+        if not admission.admit(request):
+            response = error_response(
+                "SERVICE_OVERLOADED", "The service is overloaded, please retry later.", status=503
+            )
+            response['Retry-After'] = str(settings.ADMISSION_RETRY_AFTER)
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            admission.in_flight.release()
+
+    @staticmethod
+    def _controlled(request):
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return False
+        if url_name not in settings.ADMISSION_CONTROLLED_VIEWS:
+            return False
+        # Fast lane: cached distances never reach the upstream.
+        return not (url_name == 'calculate_distance' and request.method == 'GET' and cached_distance(request))
@@ -0,0 +1,37 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:47
+
+from django.db import migrations, models
+
+from distance.geo import geohash_encode
+
+
+def backfill_geohash(apps, schema_editor):
+    Location = apps.get_model('distance', 'Location')
+    batch = []
+    for location in Location.objects.only('id', 'latitude', 'longitude').iterator(chunk_size=2000):
+        location.geohash = geohash_encode(location.latitude, location.longitude)
+        batch.append(location)
+        if len(batch) == 2000:
+            Location.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    Location.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0004_add_pg_trgm_extension'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='geohash',
+            field=models.CharField(blank=True, default='', max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['geohash'], name='distance_location_geohash_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+    ]
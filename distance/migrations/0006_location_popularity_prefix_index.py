@@ -0,0 +1,39 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:51
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0005_location_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('name'), name='varchar_pattern_ops'), name='distance_location_prefix_idx'),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE distance_location AS location SET popularity = usage.records
+            FROM (
+                SELECT location_id, COUNT(*) AS records FROM (
+                    SELECT start_location_id AS location_id FROM distance_distancerecord
+                    UNION ALL
+                    SELECT end_location_id FROM distance_distancerecord
+                ) AS endpoints
+                GROUP BY location_id
+            ) AS usage
+            WHERE location.id = usage.location_id;
+            """,
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0006_location_popularity_prefix_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CellPairDistance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_cell', models.CharField(max_length=12)),
+                ('end_cell', models.CharField(max_length=12)),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('mean_ratio', models.FloatField(default=0.0)),
+                ('ratio_m2', models.FloatField(default=0.0)),
+                ('last_record_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='cellpairdistance',
+            constraint=models.UniqueConstraint(fields=('start_cell', 'end_cell'), name='distance_cellpair_unique'),
+        ),
+    ]
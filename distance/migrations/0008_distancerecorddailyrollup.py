@@ -0,0 +1,32 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0007_cellpairdistance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistanceRecordDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('records', models.PositiveIntegerField()),
+                ('latest_distance_km', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('end_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='distance.location')),
+                ('start_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='distance.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start_location', 'end_location', 'day'], name='distance_di_start_l_6c4458_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='distancerecorddailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'start_location', 'end_location'), name='distance_rollup_day_pair_unique'),
+        ),
+    ]
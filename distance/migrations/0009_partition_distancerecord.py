@@ -0,0 +1,76 @@
+# Converts distance_distancerecord into a table range-partitioned by month
+# of created_at. PostgreSQL requires the partition key in the primary key,
+# so the table's key becomes (id, created_at); ids still come from a sequence.
+
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'distance_distancerecord'
+SEQUENCE = 'distance_distancerecord_record_id_seq'
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def partition_distance_records(apps, schema_editor):
+    execute = schema_editor.execute
+    execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy")
+    execute(f"CREATE SEQUENCE {SEQUENCE}")
+    execute(f"""
+        CREATE TABLE {TABLE} (
+            id bigint NOT NULL DEFAULT nextval('{SEQUENCE}'),
+            distance_km numeric(10, 3) NOT NULL,
+            created_at timestamp with time zone NOT NULL,
+            end_location_id bigint NOT NULL
+                CONSTRAINT {TABLE}_end_location_id_fk REFERENCES distance_location (id)
+                DEFERRABLE INITIALLY DEFERRED,
+            start_location_id bigint NOT NULL
+                CONSTRAINT {TABLE}_start_location_id_fk REFERENCES distance_location (id)
+                DEFERRABLE INITIALLY DEFERRED,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    execute(f"ALTER SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id")
+    execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(created_at) FROM {TABLE}_legacy")
+        first = cursor.fetchone()[0]
+    this_month = date.today().replace(day=1)
+    month = first.date().replace(day=1) if first else this_month
+    while month <= add_months(this_month, MONTHS_AHEAD):
+        next_month = add_months(month, 1)
+        execute(
+            f"CREATE TABLE {TABLE}_p{month:%Y_%m} PARTITION OF {TABLE} "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{next_month.isoformat()} 00:00:00+00')"
+        )
+        month = next_month
+
+    execute(f"""
+        INSERT INTO {TABLE} (id, distance_km, created_at, end_location_id, start_location_id)
+        SELECT id, distance_km, created_at, end_location_id, start_location_id FROM {TABLE}_legacy
+    """)
+    execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)")
+    execute(f"DROP TABLE {TABLE}_legacy")
+
+    # Same index names as the unpartitioned table had.
+    for column in ('start_location_id', 'end_location_id'):
+        name = schema_editor._create_index_name(TABLE, [column])
+        execute(f"CREATE INDEX {name} ON {TABLE} ({column})")
+    execute(f"CREATE INDEX distance_di_start_l_1b9ea2_idx ON {TABLE} (start_location_id, end_location_id)")
+    execute(f"CREATE INDEX distance_di_created_d1d7de_idx ON {TABLE} (created_at)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0008_distancerecorddailyrollup'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_distance_records, elidable=False),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.7 on 2026-10-19 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0009_partition_distancerecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('requests', models.BigIntegerField(default=0)),
+                ('cache_hits', models.BigIntegerField(default=0)),
+                ('cache_misses', models.BigIntegerField(default=0)),
+                ('upstream_calls', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LocationUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requests', models.BigIntegerField(default=0)),
+                ('location', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='distance.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-requests'], name='distance_locationusage_top_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PairUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('requests', models.BigIntegerField(default=0)),
+                ('end_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='distance.location')),
+                ('start_location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='distance.location')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-requests'], name='distance_pairusage_top_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pairusage',
+            constraint=models.UniqueConstraint(fields=('start_location', 'end_location'), name='distance_pairusage_unique'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:02
+
+# Decimal columns become double precision. ALTER COLUMN ... TYPE converts the
+# existing rows in place, rewriting each table (for distance_distancerecord,
+# every partition), so run it in a quiet period. Statements the workers
+# prepared before it (DATABASE_PREPARED_STATEMENTS) are then rejected with
+# "cached plan must not change result type"; distance.db.run_prepared
+# re-prepares them on that error, so the workers need no restart.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0010_usage_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='distancerecord',
+            name='distance_km',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='distancerecorddailyrollup',
+            name='latest_distance_km',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='latitude',
+            field=models.FloatField(),
+        ),
+        migrations.AlterField(
+            model_name='location',
+            name='longitude',
+            field=models.FloatField(),
+        ),
+    ]
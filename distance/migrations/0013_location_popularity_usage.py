@@ -0,0 +1,24 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0012_rollupwatermark'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='locationusage',
+            name='location',
+        ),
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['-popularity'], name='distance_location_top_idx'),
+        ),
+        migrations.DeleteModel(
+            name='LocationUsage',
+        ),
+    ]
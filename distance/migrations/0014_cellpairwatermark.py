@@ -0,0 +1,34 @@
+# Generated by Django 5.0.7 on 2026-10-19 11:51
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def copy_watermark(apps, schema_editor):
+    CellPairDistance = apps.get_model('distance', 'CellPairDistance')
+    CellPairWatermark = apps.get_model('distance', 'CellPairWatermark')
+    last_record_id = CellPairDistance.objects.aggregate(last=Max('last_record_id'))['last']
+    if last_record_id:
+        CellPairWatermark.objects.create(pk=1, last_record_id=last_record_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('distance', '0013_location_popularity_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CellPairWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_record_id', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(copy_watermark, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='cellpairdistance',
+            name='last_record_id',
+        ),
+    ]
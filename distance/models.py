@@ -1,30 +1,47 @@
 # models.py
 from django.contrib.postgres.search import SearchVectorField
 from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import OpClass
 from django.db import models
+from django.db.models.functions import Lower
+
+from .geo import Coordinates
 
 class Location(models.Model):
     name = models.CharField(max_length=255)
     address = models.CharField(max_length=255)
-    latitude = models.DecimalField(max_digits=9, decimal_places=6)
-    longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
     search_vector = SearchVectorField(null=True)  # Full-text search vector
+    geohash = models.CharField(max_length=12, blank=True, default='')  # Spatial cell, set on save
+    popularity = models.PositiveIntegerField(default=0)  # Served requests, merged by analytics.UsageTracker
 
     class Meta:
         indexes = [
             models.Index(fields=['name']),
             models.Index(fields=['latitude', 'longitude']),
             GinIndex(fields=['search_vector']),  # GIN index for full-text search
+            # Prefix (LIKE 'abc%') lookups for geohash cell searches
+            models.Index(fields=['geohash'], name='distance_location_geohash_idx',
+                         opclasses=['varchar_pattern_ops']),
+            # Case-insensitive prefix lookups for autocomplete
+            models.Index(OpClass(Lower('name'), name='varchar_pattern_ops'),
+                         name='distance_location_prefix_idx'),
+            models.Index(fields=['-popularity'], name='distance_location_top_idx'),
         ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def coordinates(self):
+        return Coordinates(self.latitude, self.longitude)
+
 
 class DistanceRecord(models.Model):
     start_location = models.ForeignKey(Location, related_name='start_location', on_delete=models.CASCADE)
     end_location = models.ForeignKey(Location, related_name='end_location', on_delete=models.CASCADE)
-    distance_km = models.DecimalField(max_digits=10, decimal_places=3)
+    distance_km = models.FloatField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -35,3 +52,93 @@ class DistanceRecord(models.Model):
 
     def __str__(self):
         return f"{self.start_location} to {self.end_location} - {self.distance_km} km"
+
+
+class DistanceRecordDailyRollup(models.Model):
+    """
+    Per-day, per-pair summary of ``DistanceRecord``. Outlives the raw rows,
+    whose monthly partitions are dropped after the retention period.
+    """
+    day = models.DateField()
+    start_location = models.ForeignKey(Location, related_name='+', on_delete=models.CASCADE)
+    end_location = models.ForeignKey(Location, related_name='+', on_delete=models.CASCADE)
+    records = models.PositiveIntegerField()
+    latest_distance_km = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'start_location', 'end_location'],
+                                    name='distance_rollup_day_pair_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['start_location', 'end_location', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.start_location} to {self.end_location} x{self.records}"
+
+
+class RollupWatermark(models.Model):
+    """
+    Newest day whose ``DistanceRecord`` rows are all included in the daily
+    rollups. A single row, advanced by ``partitions.rollup``.
+    """
+    day = models.DateField()
+
+    def __str__(self):
+        return f"Rolled up through {self.day}"
+
+
+class CellPairDistance(models.Model):
+    """
+    Road-to-straight-line distance ratio learned from ``DistanceRecord`` rows
+    between two geohash cells, used for approximate distances.
+    """
+    start_cell = models.CharField(max_length=12)
+    end_cell = models.CharField(max_length=12)
+    samples = models.PositiveIntegerField(default=0)
+    mean_ratio = models.FloatField(default=0.0)
+    ratio_m2 = models.FloatField(default=0.0)  # Sum of squared deviations (Welford)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['start_cell', 'end_cell'], name='distance_cellpair_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.start_cell} to {self.end_cell} - x{self.mean_ratio:.3f} ({self.samples} samples)"
+
+
+class CellPairWatermark(models.Model):
+    """
+    Newest ``DistanceRecord`` id read by ``ApproxDistanceService.rebuild``,
+    including records it skipped. A single row.
+    """
+    last_record_id = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Learned from records up to {self.last_record_id}"
+
+
+class PairUsage(models.Model):
+    """Served requests per (start, end) location pair, merged from worker counters."""
+    start_location = models.ForeignKey(Location, related_name='+', on_delete=models.CASCADE)
+    end_location = models.ForeignKey(Location, related_name='+', on_delete=models.CASCADE)
+    requests = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['start_location', 'end_location'], name='distance_pairusage_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['-requests'], name='distance_pairusage_top_idx'),
+        ]
+
+
+class DailyUsage(models.Model):
+    """Per-day request, cache and upstream call totals."""
+    day = models.DateField(unique=True)
+    requests = models.BigIntegerField(default=0)
+    cache_hits = models.BigIntegerField(default=0)
+    cache_misses = models.BigIntegerField(default=0)
+    upstream_calls = models.BigIntegerField(default=0)
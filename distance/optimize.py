@@ -0,0 +1,116 @@
+# optimize.py
+"""
+Visiting-order optimization for multi-stop routes.
+
+A nearest-neighbour tour is improved with 2-opt (segment reversal) and
+Or-opt (moving runs of 1-3 stops) until no move helps or the time budget is
+spent. Distances may be asymmetric, so 2-opt accounts for the reversed
+segment's own cost.
+
+The route is handled as a path with fixed ends: for a round trip both ends
+are the start stop; for an open route the end is a dummy stop that is free
+to reach from anywhere.
+"""
+import time
+
+import numpy as np
+
+EPSILON = 1e-9
+
+
+def _nearest_neighbor(matrix, start, stops):
+    path = [start]
+    remaining = set(stops)
+    while remaining:
+        row = matrix[path[-1]]
+        nearest = min(remaining, key=row.__getitem__)
+        path.append(nearest)
+        remaining.remove(nearest)
+    return path
+
+
+def _leg_costs(matrix, path):
+    forward = np.concatenate(([0.0], np.cumsum(matrix[path[:-1], path[1:]])))
+    backward = np.concatenate(([0.0], np.cumsum(matrix[path[1:], path[:-1]])))
+    return forward, backward
+
+
+def _two_opt(matrix, path):
+    """Apply the best segment reversal for each start position. Returns True if improved."""
+    improved = False
+    last = len(path) - 2
+    forward, backward = _leg_costs(matrix, path)
+    for i in range(1, last):
+        j = np.arange(i + 1, last + 1)
+        delta = (
+            matrix[path[i - 1], path[j]] + matrix[path[i], path[j + 1]]
+            - matrix[path[i - 1], path[i]] - matrix[path[j], path[j + 1]]
+            + (backward[j] - backward[i]) - (forward[j] - forward[i])
+        )
+        best = int(np.argmin(delta))
+        if delta[best] < -EPSILON:
+            path[i:j[best] + 1] = path[i:j[best] + 1][::-1]
+            forward, backward = _leg_costs(matrix, path)
+            improved = True
+    return improved
+
+
+def _or_opt(matrix, path):
+    """Relocate the run of 1-3 stops that saves the most. Returns True if improved."""
+    improved = False
+    for length in (1, 2, 3):
+        i = 1
+        while i + length <= len(path) - 1:
+            first, last = path[i], path[i + length - 1]
+            before, after = path[i - 1], path[i + length]
+            removal_gain = (
+                matrix[before, first] + matrix[last, after] - matrix[before, after]
+            )
+            rest = np.concatenate((path[:i], path[i + length:]))
+            a, b = rest[:-1], rest[1:]
+            delta = matrix[a, first] + matrix[last, b] - matrix[a, b] - removal_gain
+            delta[i - 1] = np.inf  # its current position
+            best = int(np.argmin(delta))
+            if delta[best] < -EPSILON:
+                segment = path[i:i + length].copy()
+                path[:] = np.concatenate((rest[:best + 1], segment, rest[best + 1:]))
+                improved = True
+            else:
+                i += 1
+    return improved
+
+
+def optimize_route(distances, round_trip=False, time_budget=0.5):
+    """
+    Order the stops of an ``n x n`` distance matrix, starting at stop 0.
+
+    Returns ``(order, total)`` where ``order`` lists stop indices in visiting
+    order (ending back at 0 for a round trip) and ``total`` is its length.
+    """
+    matrix = np.asarray(distances, dtype=float)
+    n = len(matrix)
+    if n <= 1:
+        return [0] * n, 0.0
+    deadline = time.monotonic() + time_budget
+
+    if round_trip:
+        end = 0
+    else:
+        # Dummy end stop reachable at no cost from every stop.
+        matrix = np.pad(matrix, ((0, 1), (0, 1)))
+        end = n
+
+    path = np.array(_nearest_neighbor(matrix, 0, range(1, n)) + [end])
+    while time.monotonic() < deadline:
+        improved = _two_opt(matrix, path)
+        if time.monotonic() >= deadline:
+            break
+        improved = _or_opt(matrix, path) or improved
+        if not improved:
+            break
+
+    order = [int(stop) for stop in path]
+    if not round_trip:
+        order = order[:-1]
+    total = float(sum(distances[a][b] for a, b in zip(order, order[1:])))
+    return order, total
@@ -0,0 +1,208 @@
+# partitions.py
+"""
+Maintenance of the range-partitioned ``distance_distancerecord`` table
+(see migration 0009): one partition per calendar month of ``created_at``
+plus a default partition that should stay empty.
+
+- ``ensure_partitions`` creates the partitions for the coming months, and
+  for a month that was missing moves its rows out of the default partition,
+- ``rollup`` summarises raw rows into ``DistanceRecordDailyRollup`` and
+  advances the ``RollupWatermark`` past every complete day it covered,
+- ``drop_expired_partitions`` drops whole months past the retention period
+  once the watermark has passed them, instead of running ``DELETE``.
+"""
+import re
+from datetime import date, timedelta
+
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from .models import DistanceRecord, DistanceRecordDailyRollup, RollupWatermark
+
+PARENT_TABLE = DistanceRecord._meta.db_table
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+PARTITION_NAME = re.compile(rf'^{PARENT_TABLE}_p(\d{{4}})_(\d{{2}})$')
+
+
+def add_months(month, count):
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return date(month.year + years, month_index + 1, 1)
+
+
+def partition_name(month):
+    return f"{PARENT_TABLE}_p{month:%Y_%m}"
+
+
+def month_bounds(month):
+    return f"{month.isoformat()} 00:00:00+00", f"{add_months(month, 1).isoformat()} 00:00:00+00"
+
+
+def create_partition_sql(month):
+    start, end = month_bounds(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+
+
+def _connection():
+    return connections[router.db_for_write(DistanceRecord)]
+
+
+def partition_months():
+    """Months that currently have a partition, oldest first."""
+    with _connection().cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(month):
+    """
+    Create the partition for ``month``. Rows of that month written to the
+    default partition while it was missing (e.g. the maintenance job did not
+    run in time) would make a plain CREATE fail, so they are moved across:
+    the default partition is detached, the month created, its rows moved and
+    the default reattached, in one transaction.
+    """
+    connection = _connection()
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s)",
+            month_bounds(month),
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(create_partition_sql(month))
+            return
+        # Run the deferred FK checks now: tables with pending trigger events can't be altered.
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}")
+        cursor.execute(create_partition_sql(month))
+        cursor.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s RETURNING *
+            )
+            INSERT INTO {partition_name(month)} SELECT * FROM moved
+            """,
+            month_bounds(month),
+        )
+        cursor.execute(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT")
+
+
+def default_partition_months():
+    """Months that have rows in the default partition, oldest first."""
+    with _connection().cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT date_trunc('month', created_at AT TIME ZONE 'UTC')::date "
+            f"FROM {DEFAULT_PARTITION} ORDER BY 1"
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def ensure_partitions(months_ahead):
+    """
+    Create the partitions for this month and the next ``months_ahead``, and
+    for any past month whose rows ended up in the default partition. Returns
+    those created.
+    """
+    existing = set(partition_months())
+    this_month = timezone.now().date().replace(day=1)
+    months = set(default_partition_months())
+    months.update(add_months(this_month, offset) for offset in range(months_ahead + 1))
+    created = []
+    for month in sorted(months - existing):
+        create_partition(month)
+        created.append(month)
+    return created
+
+
+def rolled_up_through():
+    """The rollup watermark: the newest day fully rolled up, or None before the first run."""
+    # Read from the database rollup() writes it to, not a lagging replica.
+    return RollupWatermark.objects.using(_connection().alias).values_list('day', flat=True).first()
+
+
+def rollup(since=None):
+    """
+    Recompute the daily rollups for every day from ``since`` (default: the
+    day after the watermark) up to today. Returns the number of rollup rows
+    written.
+
+    The watermark only advances, to yesterday, when no day between it and
+    ``since`` was skipped; today is still being written to.
+    """
+    watermark = rolled_up_through()
+    if watermark is not None:
+        covered_from = watermark + timedelta(days=1)
+    else:
+        first = DistanceRecord.objects.order_by('created_at').values_list('created_at', flat=True).first()
+        covered_from = first.date() if first is not None else None
+    if since is None:
+        if covered_from is None:
+            return 0
+        since = covered_from
+    today = timezone.now().date()
+
+    with _connection().cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {DistanceRecordDailyRollup._meta.db_table}
+                (day, start_location_id, end_location_id, records, latest_distance_km)
+            SELECT
+                (created_at AT TIME ZONE 'UTC')::date,
+                start_location_id,
+                end_location_id,
+                COUNT(*),
+                (ARRAY_AGG(distance_km ORDER BY created_at DESC))[1]
+            FROM {PARENT_TABLE}
+            WHERE created_at >= %s
+            GROUP BY 1, 2, 3
+            ON CONFLICT (day, start_location_id, end_location_id) DO UPDATE SET
+                records = EXCLUDED.records,
+                latest_distance_km = EXCLUDED.latest_distance_km
+            """,
+            [f"{since.isoformat()} 00:00:00+00"],
+        )
+        written = cursor.rowcount
+
+    if covered_from is None or since <= covered_from:
+        day = today - timedelta(days=1)
+        if watermark is None or day > watermark:
+            RollupWatermark.objects.update_or_create(pk=1, defaults={'day': day})
+    return written
+
+
+def drop_expired_partitions(retention_months):
+    """
+    Drop the monthly partitions that ended more than ``retention_months``
+    ago and whose every day is behind the rollup watermark. Returns the
+    months dropped.
+    """
+    cutoff = add_months(timezone.now().date().replace(day=1), -retention_months)
+    last_rolled_up = rolled_up_through()
+    if last_rolled_up is None:
+        return []
+
+    dropped = []
+    with _connection().cursor() as cursor:
+        for month in partition_months():
+            month_end = add_months(month, 1)
+            if month_end > cutoff or month_end - timedelta(days=1) > last_rolled_up:
+                break
+            cursor.execute(f"DROP TABLE {partition_name(month)}")
+            dropped.append(month)
+    return dropped
@@ -0,0 +1,109 @@
+# providers.py
+"""
+Distance providers selectable per request (``?provider=``) or through
+``settings.DISTANCE_PROVIDER``.
+
+Only providers with ``records_distances`` have their results stored as
+``DistanceRecord`` rows, which are read back as Google Maps distances
+(matrix reuse, cache warmup, approximate distance ratios). Local routing
+results are cheap to recompute and are not stored.
+"""
+from django.conf import settings
+
+from .routing import RoadGraph
+from .services import DistanceService, LocationService
+
+# Distance Matrix API blocks: at most 100 elements per call.
+MATRIX_BLOCK_SIZE = 10
+
+
+class GoogleMapsProvider:
+    name = 'google'
+    service = "Google Maps API"
+    records_distances = True
+
+    def available(self):
+        return True
+
+    def distance(self, start_location, end_location, deadline=None):
+        start, end = start_location.coordinates, end_location.coordinates
+        return LocationService.calculate_distance(start.lat, start.lng, end.lat, end.lng, deadline=deadline)
+
+    def matrix(self, locations, deadline=None):
+        """
+        Pairwise distances between ``locations``, reusing recorded distances
+        and fetching only the blocks of pairs that are still unknown. Newly
+        fetched distances are recorded.
+        """
+        known = DistanceService.known_distances(locations)
+        matrix = [
+            [0.0 if i == j else known.get((start.pk, end.pk)) for j, end in enumerate(locations)]
+            for i, start in enumerate(locations)
+        ]
+        coordinates = [location.coordinates for location in locations]
+        new_records = []
+        for row_start in range(0, len(locations), MATRIX_BLOCK_SIZE):
+            rows = range(row_start, min(row_start + MATRIX_BLOCK_SIZE, len(locations)))
+            for col_start in range(0, len(locations), MATRIX_BLOCK_SIZE):
+                cols = range(col_start, min(col_start + MATRIX_BLOCK_SIZE, len(locations)))
+                if all(matrix[i][j] is not None for i in rows for j in cols):
+                    continue
+                block = LocationService.calculate_distance_matrix(
+                    [coordinates[i] for i in rows], [coordinates[j] for j in cols], deadline=deadline
+                )
+                if block is None:
+                    continue
+                for i, block_row in zip(rows, block):
+                    for j, distance_km in zip(cols, block_row):
+                        if matrix[i][j] is None and distance_km is not None:
+                            matrix[i][j] = distance_km
+                            new_records.append((locations[i], locations[j], distance_km))
+        DistanceService.save_distance_records(new_records)
+        return matrix
+
+
+class LocalRoutingProvider:
+    name = 'local'
+    service = "Local routing engine"
+    records_distances = False
+
+    _graph = None
+
+    def available(self):
+        return bool(settings.ROUTING_GRAPH_PATH)
+
+    @classmethod
+    def graph(cls):
+        """The road graph, loaded once per process from ``ROUTING_GRAPH_PATH``."""
+        if cls._graph is None:
+            cls._graph = RoadGraph.load(settings.ROUTING_GRAPH_PATH)
+        return cls._graph
+
+    def distance(self, start_location, end_location, deadline=None):
+        if not settings.ROUTING_GRAPH_PATH:
+            return None
+        return self.graph().distance_km(
+            *start_location.coordinates, *end_location.coordinates, max_snap_km=settings.ROUTING_MAX_SNAP_KM
+        )
+
+    def matrix(self, locations, deadline=None):
+        if not settings.ROUTING_GRAPH_PATH:
+            return [[None] * len(locations) for _ in locations]
+        return self.graph().distance_matrix_km(
+            [location.coordinates for location in locations],
+            max_snap_km=settings.ROUTING_MAX_SNAP_KM
+        )
+
+
+PROVIDERS = {provider.name: provider for provider in (GoogleMapsProvider(), LocalRoutingProvider())}
+
+
+def get_provider(name=None):
+    """
+    Return the provider called ``name`` (default from settings), or None if
+    unknown or not configured (local routing without ``ROUTING_GRAPH_PATH``).
+    """
+    provider = PROVIDERS.get(name or settings.DISTANCE_PROVIDER)
+    if provider is not None and not provider.available():
+        return None
+    return provider
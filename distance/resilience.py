@@ -0,0 +1,198 @@
+# resilience.py
+"""
+Guards for the upstream Google Maps calls: a circuit breaker per endpoint,
+a per-request deadline budget, optional hedged requests and a rate limiter
+for batch jobs.
+
+Breaker state lives in the Django cache, so it is shared by every worker
+when ``CACHES`` points at a shared backend such as Redis.
+"""
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.cache import cache
+
+from .analytics import tracker as usage
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """The breaker for an upstream endpoint is open; the call was not made."""
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The request's upstream time budget is spent."""
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, name):
+        self.name = name
+        self.failures_key = f"breaker:{name}:failures"
+        self.opened_at_key = f"breaker:{name}:opened_at"
+        self.probe_key = f"breaker:{name}:probe"
+
+    @property
+    def state(self):
+        opened_at = cache.get(self.opened_at_key)
+        if opened_at is None:
+            return self.CLOSED
+        if time.time() - opened_at < settings.MAPS_BREAKER_RESET_TIMEOUT:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow_request(self):
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # Let a single worker through to probe the endpoint.
+            return cache.add(self.probe_key, True, timeout=settings.MAPS_BREAKER_RESET_TIMEOUT)
+        return False
+
+    def record_success(self):
+        cache.delete_many([self.failures_key, self.opened_at_key, self.probe_key])
+
+    def record_failure(self):
+        if self.state == self.HALF_OPEN:
+            self._open()
+            return
+        cache.add(self.failures_key, 0, timeout=settings.MAPS_BREAKER_RESET_TIMEOUT)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            # The counter expired between add() and incr().
+            failures = 1
+        if failures >= settings.MAPS_BREAKER_FAILURE_THRESHOLD:
+            self._open()
+
+    def _open(self):
+        cache.set(self.opened_at_key, time.time(), timeout=None)
+        cache.delete_many([self.failures_key, self.probe_key])
+
+
+class Deadline:
+    """Time budget for all upstream calls made while serving one request."""
+
+    def __init__(self, seconds=None):
+        if seconds is None:
+            seconds = settings.MAPS_REQUEST_DEADLINE
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, reserve=0.0):
+        """
+        Timeout for the next call, keeping ``reserve`` seconds for the calls
+        that follow it and never exceeding ``MAPS_REQUEST_TIMEOUT``.
+        """
+        budget = min(self.remaining() - reserve, settings.MAPS_REQUEST_TIMEOUT)
+        if budget <= 0:
+            raise DeadlineExceeded("Upstream time budget exhausted.")
+        return budget
+
+
+class RateLimiter:
+    """
+    Token bucket allowing ``rate`` calls per second on average and bursts of
+    up to ``burst``; ``acquire`` blocks until a token is available. Shared by
+    the threads of one process.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        # Waiters have already reserved their token, so they can sleep unlocked.
+        if wait:
+            time.sleep(wait)
+
+
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='maps-hedge')
+
+# Keep-alive connection pool for the Maps API, so calls after the first one
+# (or after startup warmup) skip the TCP and TLS handshakes. Created per
+# process on first use: pooled sockets must not be shared across a fork.
+MAPS_ORIGIN = "https://maps.googleapis.com"
+_sessions = {}
+
+
+def http_session():
+    pid = os.getpid()
+    if pid not in _sessions:
+        session = requests.Session()
+        session.mount(MAPS_ORIGIN, HTTPAdapter(pool_connections=1, pool_maxsize=16))
+        _sessions.clear()
+        _sessions[pid] = session
+    return _sessions[pid]
+
+
+def hedged_get(url, timeout):
+    """
+    GET ``url``, firing a second identical request if the first has not
+    answered after ``MAPS_HEDGE_AFTER`` seconds; the first response wins.
+    """
+    hedge_after = settings.MAPS_HEDGE_AFTER
+    if not hedge_after or hedge_after >= timeout:
+        return http_session().get(url, timeout=timeout)
+
+    started = time.monotonic()
+    get = http_session().get
+    futures = [_hedge_executor.submit(get, url, timeout=timeout)]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        futures.append(_hedge_executor.submit(get, url, timeout=timeout - hedge_after))
+
+    error = None
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, timeout - (time.monotonic() - started)),
+                             return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            try:
+                return future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+    raise error or requests.exceptions.Timeout(f"No response from {url} within {timeout}s")
+
+
+def guarded_get(endpoint, url, deadline=None, reserve=0.0):
+    """
+    GET an upstream ``endpoint`` through its circuit breaker, within the
+    request ``deadline`` if one is given. Raises ``RequestException`` subclasses
+    on failure so callers keep a single error path.
+    """
+    breaker = CircuitBreaker(endpoint)
+    if not breaker.allow_request():
+        raise CircuitOpenError(f"Circuit for {endpoint} is open.")
+
+    timeout = settings.MAPS_REQUEST_TIMEOUT if deadline is None else deadline.timeout(reserve)
+    usage.record_upstream_call()
+    try:
+        response = hedged_get(url, timeout)
+        response.raise_for_status()
+    except requests.exceptions.RequestException:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return response
@@ -0,0 +1,111 @@
+# routers.py
+"""
+Database router that sends reads to the replicas configured in
+``settings.DATABASE_REPLICAS`` and writes to ``default``.
+
+Once a request has written anything, its remaining reads are pinned to the
+primary so that a location created earlier in the same request is visible.
+Replicas that are unreachable or lag by more than
+``settings.DATABASE_REPLICA_MAX_LAG`` seconds are skipped until the next check.
+Checks run in a background thread, so requests never wait on an unreachable
+replica; they use the result of the last check meanwhile.
+"""
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+PRIMARY = 'default'
+
+_pinned = ContextVar('distance_pinned_to_primary', default=False)
+
+_health = {'checked_at': 0.0, 'replicas': [], 'checking_pid': None}
+_lock = threading.Lock()
+
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+def pin_to_primary():
+    """Route every following read in this request/context to the primary."""
+    _pinned.set(True)
+
+
+def unpin():
+    _pinned.set(False)
+
+
+def replica_lag(alias):
+    """Return the replication lag of ``alias`` in seconds."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(REPLICA_LAG_SQL)
+            return float(cursor.fetchone()[0])
+    except DatabaseError:
+        # Drop the broken connection so the next check reconnects.
+        connection.close()
+        raise
+
+
+def check_replicas():
+    """Probe every replica and record those that are up and within the lag budget."""
+    healthy = []
+    for alias in settings.DATABASE_REPLICAS:
+        try:
+            if replica_lag(alias) <= settings.DATABASE_REPLICA_MAX_LAG:
+                healthy.append(alias)
+        except DatabaseError:
+            pass
+    _health['replicas'] = healthy
+    _health['checked_at'] = time.monotonic()
+
+
+def _check_in_background():
+    try:
+        check_replicas()
+    finally:
+        _health['checking_pid'] = None
+        # Django connections are per thread; don't leave this one's open.
+        connections.close_all()
+
+
+def healthy_replicas():
+    """
+    Return the replica aliases found healthy by the last check, starting a
+    new check in the background when that one is stale.
+    """
+    if time.monotonic() - _health['checked_at'] >= settings.DATABASE_REPLICA_CHECK_INTERVAL:
+        with _lock:
+            # Compared with the pid: a check running when the process forked doesn't run in the child.
+            if _health['checking_pid'] != os.getpid():
+                _health['checking_pid'] = os.getpid()
+                threading.Thread(target=_check_in_background, name='replica-health', daemon=True).start()
+    return _health['replicas']
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _pinned.get():
+            return PRIMARY
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        pin_to_primary()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # All aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,190 @@
+# routing.py
+"""
+Local road-network routing engine.
+
+The road graph is read from a plain-text file derived from an OSM extract::
+
+    # comment
+    N <node_id> <lat> <lng>
+    E <from_node_id> <to_node_id> <length_m> [oneway]
+
+Edges are two-way unless marked ``oneway``. The graph is held as a compact
+CSR (compressed sparse row) adjacency: per-node offsets into flat arrays of
+edge targets and lengths. Shortest paths are answered with A* using the
+great-circle distance as heuristic.
+"""
+import heapq
+import math
+from array import array
+from collections import defaultdict
+
+from .geo import haversine_km
+
+# Snapping grid cell size in degrees (~1 km at the equator).
+GRID_CELL_DEGREES = 0.01
+
+
+class RoadGraph:
+    def __init__(self, latitudes, longitudes, offsets, targets, lengths):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.offsets = offsets
+        self.targets = targets
+        self.lengths = lengths
+        self._grid = defaultdict(list)
+        for node in range(len(latitudes)):
+            self._grid[self._cell(latitudes[node], longitudes[node])].append(node)
+
+    def __len__(self):
+        return len(self.latitudes)
+
+    @classmethod
+    def from_edges(cls, nodes, edges):
+        """
+        Build a graph from ``nodes`` ({node_id: (lat, lng)}) and ``edges``
+        (iterable of (from_id, to_id, length_m, oneway)).
+        """
+        index = {node_id: i for i, node_id in enumerate(nodes)}
+        latitudes = array('d', (lat for lat, _ in nodes.values()))
+        longitudes = array('d', (lng for _, lng in nodes.values()))
+
+        adjacency = defaultdict(list)
+        for from_id, to_id, length_m, oneway in edges:
+            u, v = index[from_id], index[to_id]
+            adjacency[u].append((v, length_m))
+            if not oneway:
+                adjacency[v].append((u, length_m))
+
+        offsets = array('l', [0])
+        targets = array('l')
+        lengths = array('d')
+        for node in range(len(index)):
+            for target, length_m in adjacency.get(node, ()):
+                targets.append(target)
+                lengths.append(length_m)
+            offsets.append(len(targets))
+        return cls(latitudes, longitudes, offsets, targets, lengths)
+
+    @classmethod
+    def load(cls, path):
+        nodes = {}
+        edges = []
+        with open(path) as graph_file:
+            for line_number, line in enumerate(graph_file, 1):
+                fields = line.split()
+                if not fields or fields[0].startswith('#'):
+                    continue
+                if fields[0] == 'N' and len(fields) == 4:
+                    nodes[fields[1]] = (float(fields[2]), float(fields[3]))
+                elif fields[0] == 'E' and len(fields) in (4, 5):
+                    edges.append((fields[1], fields[2], float(fields[3]),
+                                  len(fields) == 5 and fields[4] == 'oneway'))
+                else:
+                    raise ValueError(f"{path}:{line_number}: malformed line {line.strip()!r}")
+        return cls.from_edges(nodes, edges)
+
+    @staticmethod
+    def _cell(lat, lng):
+        return (math.floor(lat / GRID_CELL_DEGREES), math.floor(lng / GRID_CELL_DEGREES))
+
+    def nearest_node(self, lat, lng, max_km):
+        """Return (node, distance_km) of the closest node within ``max_km``, or (None, None)."""
+        lat, lng = float(lat), float(lng)
+        row, col = self._cell(lat, lng)
+        # A cell is at least ~GRID_CELL_DEGREES * 111 km * cos(lat) wide.
+        cell_km = GRID_CELL_DEGREES * 111.0 * max(math.cos(math.radians(lat)), 0.01)
+        best, best_km = None, None
+        for ring in range(int(max_km / cell_km) + 2):
+            if best is not None and best_km < (ring - 1) * cell_km:
+                break
+            for dr in range(-ring, ring + 1):
+                for dc in range(-ring, ring + 1):
+                    if max(abs(dr), abs(dc)) != ring:
+                        continue
+                    for node in self._grid.get((row + dr, col + dc), ()):
+                        km = haversine_km(lat, lng, self.latitudes[node], self.longitudes[node])
+                        if best_km is None or km < best_km:
+                            best, best_km = node, km
+        if best is None or best_km > max_km:
+            return None, None
+        return best, best_km
+
+    def shortest_path_m(self, source, target):
+        """A* shortest path length in meters between two nodes, or None if unreachable."""
+        if source == target:
+            return 0.0
+        target_lat, target_lng = self.latitudes[target], self.longitudes[target]
+
+        def heuristic(node):
+            return 1000.0 * haversine_km(self.latitudes[node], self.longitudes[node], target_lat, target_lng)
+
+        best = {source: 0.0}
+        queue = [(heuristic(source), 0.0, source)]
+        while queue:
+            _, cost, node = heapq.heappop(queue)
+            if node == target:
+                return cost
+            if cost > best.get(node, math.inf):
+                continue
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                neighbor = self.targets[edge]
+                new_cost = cost + self.lengths[edge]
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    heapq.heappush(queue, (new_cost + heuristic(neighbor), new_cost, neighbor))
+        return None
+
+    def shortest_paths_m(self, source, targets):
+        """Dijkstra from ``source``: {target: meters} for the reachable ``targets``."""
+        remaining = set(targets)
+        found = {}
+        best = {source: 0.0}
+        queue = [(0.0, source)]
+        while queue and remaining:
+            cost, node = heapq.heappop(queue)
+            if cost > best.get(node, math.inf):
+                continue
+            if node in remaining:
+                remaining.discard(node)
+                found[node] = cost
+            for edge in range(self.offsets[node], self.offsets[node + 1]):
+                neighbor = self.targets[edge]
+                new_cost = cost + self.lengths[edge]
+                if new_cost < best.get(neighbor, math.inf):
+                    best[neighbor] = new_cost
+                    heapq.heappush(queue, (new_cost, neighbor))
+        return found
+
+    def distance_matrix_km(self, points, max_snap_km):
+        """
+        Road distances in kilometers between every pair of (lat, lng)
+        ``points``, with None for pairs that cannot be routed. Runs one
+        Dijkstra per point instead of one search per pair.
+        """
+        snapped = [self.nearest_node(lat, lng, max_snap_km) for lat, lng in points]
+        nodes = {node for node, _ in snapped if node is not None}
+        matrix = []
+        for source, source_snap_km in snapped:
+            paths = self.shortest_paths_m(source, nodes) if source is not None else {}
+            row = []
+            for target, target_snap_km in snapped:
+                path_m = paths.get(target)
+                row.append(None if path_m is None else
+                           round(path_m / 1000.0 + source_snap_km + target_snap_km, 3))
+            matrix.append(row)
+        return matrix
+
+    def distance_km(self, start_lat, start_lng, end_lat, end_lng, max_snap_km):
+        """
+        Road distance in kilometers between two coordinates, including the
+        straight-line hops onto the network. None when either point is outside
+        the graph's coverage or no route exists.
+        """
+        source, source_snap_km = self.nearest_node(start_lat, start_lng, max_snap_km)
+        target, target_snap_km = self.nearest_node(end_lat, end_lng, max_snap_km)
+        if source is None or target is None:
+            return None
+        path_m = self.shortest_path_m(source, target)
+        if path_m is None:
+            return None
+        return round(path_m / 1000.0 + source_snap_km + target_snap_km, 3)
@@ -1,17 +1,41 @@
+import math
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 from django.conf import settings
-from .models import Location, DistanceRecord
+from django.core.cache import cache
+from django.db import connections, router, transaction
+from django.db.models import Q, Value
+from django.db.models.functions import Lower
+from datetime import timedelta
+
+from django.utils import timezone
+from .db import (
+    EXECUTE_FIND_LOCATION, EXECUTE_INSERT_DISTANCE_RECORD, FIND_LOCATION, INSERT_DISTANCE_RECORD, run_prepared
+)
+from .geo import Coordinates, geodesic_km, geohash_cells_covering, geohash_encode, haversine_km
+from .location_index import get_location_index
+from .resilience import guarded_get
+from .models import (
+    CellPairDistance, CellPairWatermark, DailyUsage, DistanceRecord, Location, PairUsage
+)
 from django.core.exceptions import ObjectDoesNotExist
-from django.contrib.postgres.search import SearchVector
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.contrib.postgres.search import TrigramSimilarity
 
 class LocationService:
     @staticmethod
-    def geocode_address(address):
-        """Geocode an address using Google Maps API."""
+    def geocode_address(address, deadline=None, endpoint='geocode'):
+        """
+        Geocode an address using Google Maps API.
+
+        When a request ``deadline`` is given, ``MAPS_DISTANCE_RESERVE`` seconds
+        of it are kept for the distance call that follows. ``endpoint`` names
+        the circuit breaker the call goes through.
+        """
         url = f"https://maps.googleapis.com/maps/api/geocode/json?address={address}&key={settings.GOOGLE_MAPS_API_KEY}"
         try:
-            response = requests.get(url)
-            response.raise_for_status()
+            response = guarded_get(endpoint, url, deadline, reserve=settings.MAPS_DISTANCE_RESERVE)
             results = response.json().get('results', [])
             if results:
                 location_data = results[0]
@@ -25,15 +49,15 @@ class LocationService:
             return None, None, None
 
     @staticmethod
-    def calculate_distance(start_lat, start_lng, end_lat, end_lng):
+    def calculate_distance(start_lat, start_lng, end_lat, end_lng, deadline=None):
         """Calculate distance using Google Maps Distance Matrix API."""
         url = (
             f"https://maps.googleapis.com/maps/api/distancematrix/json?"
-            f"origins={start_lat},{start_lng}&destinations={end_lat},{end_lng}&key={settings.GOOGLE_MAPS_API_KEY}"
+            f"origins={Coordinates(start_lat, start_lng)}&destinations={Coordinates(end_lat, end_lng)}"
+            f"&key={settings.GOOGLE_MAPS_API_KEY}"
         )
         try:
-            response = requests.get(url)
-            response.raise_for_status()
+            response = guarded_get('distancematrix', url, deadline)
             distance_data = response.json()
             distance_info = distance_data['rows'][0]['elements'][0]
             if distance_info['status'] == 'OK':
@@ -43,8 +67,61 @@ class LocationService:
             print(f"Error calculating distance: {e}")
             return None
 
+    @staticmethod
+    def calculate_distance_matrix(origins, destinations, deadline=None):
+        """
+        Distances in kilometers from every (lat, lng) in ``origins`` to every
+        one in ``destinations`` with a single Distance Matrix API call, as a
+        list of rows with None for unroutable pairs. None if the call fails.
+        The API allows at most 25 origins or destinations and 100 elements.
+        """
+        def join(points):
+            return '|'.join(str(Coordinates(lat, lng)) for lat, lng in points)
+
+        url = (
+            f"https://maps.googleapis.com/maps/api/distancematrix/json?"
+            f"origins={join(origins)}&destinations={join(destinations)}&key={settings.GOOGLE_MAPS_API_KEY}"
+        )
+        try:
+            response = guarded_get('distancematrix', url, deadline)
+            return [
+                [
+                    element['distance']['value'] / 1000.0 if element['status'] == 'OK' else None
+                    for element in row['elements']
+                ]
+                for row in response.json()['rows']
+            ]
+        except requests.exceptions.RequestException as e:
+            print(f"Error calculating distance matrix: {e}")
+            return None
+
 
 class DistanceService:
+    @staticmethod
+    def find_location(query):
+        """Return the best fuzzy match for a sanitized address, or None."""
+        # Exact and near-exact matches from the shared in-memory snapshot
+        index = get_location_index()
+        if index is not None:
+            location = index.lookup(query, settings.LOCATION_INDEX_MIN_SIMILARITY)
+            if location is not None:
+                return location
+
+        if settings.DATABASE_PREPARED_STATEMENTS:
+            using = router.db_for_read(Location)
+            return run_prepared(connections[using], FIND_LOCATION, lambda: next(
+                iter(Location.objects.using(using).raw(EXECUTE_FIND_LOCATION, [query])), None
+            ))
+
+        search_query = SearchQuery(query)
+        search_vector = SearchVector('name', weight='A') + SearchVector('address', weight='B')
+
+        # Use Trigram Similarity for more nuanced matching
+        return Location.objects.annotate(
+            rank=SearchRank(search_vector, search_query),
+            similarity=TrigramSimilarity('name', query) + TrigramSimilarity('address', query)
+        ).filter(similarity__gt=0.3).order_by('-similarity', '-rank').first()
+
     @staticmethod
     def get_or_create_location(name, address, lat, lng):
         location, created = Location.objects.get_or_create(
@@ -64,10 +141,324 @@ class DistanceService:
             location.save(update_fields=['search_vector'])
         return location
 
+    @staticmethod
+    def geocode_location(query, deadline=None):
+        """Geocode a sanitized address and store it as a Location; None if geocoding fails."""
+        formatted_address, lat, lng = LocationService.geocode_address(query, deadline=deadline)
+        if not formatted_address:
+            return None
+        return DistanceService.get_or_create_location(query, formatted_address, lat, lng)
+
+    @staticmethod
+    def known_distances(locations):
+        """Latest recorded distance for every ordered pair of ``locations``: {(start_id, end_id): km}."""
+        ids = [location.pk for location in locations]
+        records = DistanceRecord.objects.filter(
+            start_location__in=ids, end_location__in=ids
+        ).order_by('created_at').values_list('start_location_id', 'end_location_id', 'distance_km')
+        return {(start_id, end_id): distance_km for start_id, end_id, distance_km in records}
+
+    @staticmethod
+    def deleted_ids(locations):
+        """
+        Ids of the ``locations`` resolved from the location index snapshot that
+        have been deleted since it was built; recording them would violate the
+        foreign keys. Locations loaded from the database are not checked.
+        """
+        ids = {location.pk for location in locations if getattr(location, 'from_snapshot', False)}
+        if not ids:
+            return set()
+        using = router.db_for_write(DistanceRecord)
+        return ids - set(Location.objects.using(using).filter(pk__in=ids).values_list('pk', flat=True))
+
+    @staticmethod
+    def save_distance_records(records):
+        """Bulk-insert (start_location, end_location, distance_km) tuples."""
+        deleted = DistanceService.deleted_ids(location for record in records for location in record[:2])
+        records = [record for record in records if record[0].pk not in deleted and record[1].pk not in deleted]
+        if not records:
+            return
+        DistanceRecord.objects.bulk_create([
+            DistanceRecord(start_location=start, end_location=end, distance_km=distance_km)
+            for start, end, distance_km in records
+        ], batch_size=1000)
+
     @staticmethod
     def save_distance_record(start_location, end_location, distance_km):
+        if DistanceService.deleted_ids([start_location, end_location]):
+            return
+        if settings.DATABASE_PREPARED_STATEMENTS:
+            using = router.db_for_write(DistanceRecord)
+
+            def insert():
+                with connections[using].cursor() as cursor:
+                    cursor.execute(EXECUTE_INSERT_DISTANCE_RECORD, [
+                        start_location.pk, end_location.pk, distance_km, timezone.now()
+                    ])
+            run_prepared(connections[using], INSERT_DISTANCE_RECORD, insert)
+            return
         DistanceRecord.objects.create(
             start_location=start_location,
             end_location=end_location,
             distance_km=distance_km
         )
+
+
+class BulkGeocodeService:
+    FIELDS = ['address', 'latitude', 'longitude', 'geohash', 'search_vector']
+    # Own circuit breaker: bulk failures must not open the one live requests use.
+    ENDPOINT = 'geocode-bulk'
+
+    @staticmethod
+    def geocode(locations, limiter, workers, source='address'):
+        """
+        Geocode the ``source`` field of ``locations`` on a pool of ``workers``
+        threads, taking a ``limiter`` token before every upstream call.
+        Returns the (formatted_address, lat, lng) results in order.
+        """
+        def geocode_one(location):
+            limiter.acquire()
+            return LocationService.geocode_address(getattr(location, source), endpoint=BulkGeocodeService.ENDPOINT)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='geocode') as executor:
+            return list(executor.map(geocode_one, locations))
+
+    @staticmethod
+    def apply(locations, results):
+        """
+        Write the successful geocoding ``results`` back to ``locations`` with
+        one ``bulk_update``. Save signals do not run, so the geohash and
+        search vector are computed here. Returns the number updated.
+        """
+        updated = []
+        for location, (formatted_address, lat, lng) in zip(locations, results):
+            if not formatted_address:
+                continue
+            location.address = formatted_address
+            location.latitude = lat
+            location.longitude = lng
+            location.geohash = geohash_encode(lat, lng)
+            # Built from the new values: a column reference would read the old address
+            location.search_vector = (
+                SearchVector(Value(location.name), weight='A') +
+                SearchVector(Value(formatted_address), weight='B')
+            )
+            updated.append(location)
+        Location.objects.bulk_update(updated, BulkGeocodeService.FIELDS)
+        return len(updated)
+
+
+class NearbyService:
+    @staticmethod
+    def within_radius(lat, lng, radius_km, limit=None):
+        """
+        Locations within ``radius_km`` of the point, closest first, as
+        (location, distance_km) pairs. Candidates come from the geohash cells
+        covering the circle and are refined with the WGS84 geodesic distance.
+        """
+        lat, lng = float(lat), float(lng)
+        cells = geohash_cells_covering(lat, lng, radius_km)
+        candidates = Location.objects.only('id', 'name', 'address', 'latitude', 'longitude')
+        if cells:
+            prefix_filter = Q()
+            for cell in cells:
+                prefix_filter |= Q(geohash__startswith=cell)
+            lat_margin = radius_km / 111.0
+            candidates = candidates.filter(
+                prefix_filter, latitude__range=(lat - lat_margin, lat + lat_margin)
+            )
+
+        matches = []
+        for location in candidates.iterator():
+            distance_km = geodesic_km(lat, lng, location.latitude, location.longitude)
+            if distance_km <= radius_km:
+                matches.append((location, distance_km))
+        matches.sort(key=lambda match: match[1])
+        return matches[:limit] if limit else matches
+
+    @staticmethod
+    def nearest(lat, lng, k, max_radius_km):
+        """
+        The ``k`` locations closest to the point, searching outwards from a
+        small radius until ``k`` are found or ``max_radius_km`` is reached.
+        """
+        radius_km = min(1.0, max_radius_km)
+        while True:
+            matches = NearbyService.within_radius(lat, lng, radius_km, limit=k)
+            if len(matches) >= k or radius_km >= max_radius_km:
+                return matches
+            radius_km = min(radius_km * 4, max_radius_km)
+
+
+class AutocompleteService:
+    @staticmethod
+    def suggest(prefix, limit):
+        """
+        Up to ``limit`` locations whose name starts with ``prefix``
+        (case-insensitive), most used first. Uses the ``lower(name)``
+        prefix index and caches each answer briefly.
+        """
+        prefix = prefix.strip().lower()
+        cache_key = f"autocomplete:{limit}:{prefix}"
+        suggestions = cache.get(cache_key)
+        if suggestions is None:
+            suggestions = [
+                {
+                    "id": location_id,
+                    "name": name,
+                    "formatted_address": address,
+                    "coordinates": {"latitude": latitude, "longitude": longitude}
+                }
+                for location_id, name, address, latitude, longitude in
+                Location.objects.annotate(name_lower=Lower('name'))
+                .filter(name_lower__startswith=prefix)
+                .order_by('-popularity', 'name_lower')
+                .values_list('id', 'name', 'address', 'latitude', 'longitude')[:limit]
+            ]
+            cache.set(cache_key, suggestions, timeout=settings.AUTOCOMPLETE_CACHE_TIMEOUT)
+        return suggestions
+
+
+class ApproxDistanceService:
+    @staticmethod
+    def cells(start_location, end_location):
+        precision = settings.APPROX_GEOHASH_PRECISION
+        return (
+            geohash_encode(*start_location.coordinates, precision),
+            geohash_encode(*end_location.coordinates, precision),
+        )
+
+    @staticmethod
+    def estimate(start_location, end_location):
+        """
+        Approximate road distance as (distance_km, error_bound_km): the
+        straight-line distance scaled by the ratio learned for the two
+        locations' geohash cells. None when the cell pair is not known well
+        enough. The bound covers two standard deviations of the ratio.
+        """
+        start_cell, end_cell = ApproxDistanceService.cells(start_location, end_location)
+        pair = CellPairDistance.objects.filter(
+            Q(start_cell=start_cell, end_cell=end_cell) | Q(start_cell=end_cell, end_cell=start_cell),
+            samples__gte=settings.APPROX_MIN_SAMPLES
+        ).order_by('-samples').first()
+        if pair is None:
+            return None
+
+        straight_km = haversine_km(*start_location.coordinates, *end_location.coordinates)
+        ratio_std = math.sqrt(pair.ratio_m2 / (pair.samples - 1)) if pair.samples > 1 else 0.0
+        return round(straight_km * pair.mean_ratio, 3), round(straight_km * 2 * ratio_std, 3)
+
+    @staticmethod
+    def rebuild(full=False, batch_size=10000):
+        """
+        Learn cell-pair ratios from the distance records added since the last
+        rebuild (all records when ``full``). Returns the number of records read.
+        Records too short to give a meaningful ratio are skipped.
+        """
+        if full:
+            with transaction.atomic():
+                CellPairDistance.objects.all().delete()
+                CellPairWatermark.objects.all().delete()
+        watermark = CellPairWatermark.objects.values_list('last_record_id', flat=True).first() or 0
+        precision = settings.APPROX_GEOHASH_PRECISION
+        processed = 0
+
+        while True:
+            records = list(
+                DistanceRecord.objects.filter(id__gt=watermark).order_by('id').values_list(
+                    'id', 'distance_km',
+                    'start_location__latitude', 'start_location__longitude',
+                    'end_location__latitude', 'end_location__longitude',
+                )[:batch_size]
+            )
+            if not records:
+                return processed
+            processed += len(records)
+            watermark = records[-1][0]
+
+            # Per cell pair: [samples, mean ratio, m2] for this batch (Welford)
+            batch = {}
+            for _, distance_km, start_lat, start_lng, end_lat, end_lng in records:
+                straight_km = haversine_km(start_lat, start_lng, end_lat, end_lng)
+                if straight_km < settings.APPROX_MIN_STRAIGHT_KM:
+                    continue
+                ratio = distance_km / straight_km
+                key = (geohash_encode(start_lat, start_lng, precision), geohash_encode(end_lat, end_lng, precision))
+                stats = batch.setdefault(key, [0, 0.0, 0.0])
+                stats[0] += 1
+                delta = ratio - stats[1]
+                stats[1] += delta / stats[0]
+                stats[2] += delta * (ratio - stats[1])
+
+            existing = {
+                (pair.start_cell, pair.end_cell): pair
+                for pair in CellPairDistance.objects.filter(
+                    start_cell__in={start for start, _ in batch}, end_cell__in={end for _, end in batch}
+                )
+            }
+            to_create, to_update = [], []
+            for (start_cell, end_cell), (samples, mean, m2) in batch.items():
+                pair = existing.get((start_cell, end_cell))
+                if pair is None:
+                    to_create.append(CellPairDistance(
+                        start_cell=start_cell, end_cell=end_cell, samples=samples,
+                        mean_ratio=mean, ratio_m2=m2
+                    ))
+                    continue
+                # Chan et al. parallel merge of the two running variances
+                total = pair.samples + samples
+                delta = mean - pair.mean_ratio
+                pair.ratio_m2 += m2 + delta * delta * pair.samples * samples / total
+                pair.mean_ratio += delta * samples / total
+                pair.samples = total
+                to_update.append(pair)
+
+            with transaction.atomic():
+                CellPairDistance.objects.bulk_create(to_create, batch_size=1000)
+                CellPairDistance.objects.bulk_update(to_update, ['samples', 'mean_ratio', 'ratio_m2'], batch_size=1000)
+                # Past every record read, also when all of them were skipped
+                CellPairWatermark.objects.update_or_create(pk=1, defaults={'last_record_id': watermark})
+
+
+class UsageStatsService:
+    """Reads of the usage counters maintained by ``analytics.tracker``."""
+
+    @staticmethod
+    def _location(location):
+        return {"id": location.pk, "name": location.name, "formatted_address": location.address}
+
+    @staticmethod
+    def top_pairs(limit):
+        return [
+            {
+                "start_location": UsageStatsService._location(usage.start_location),
+                "end_location": UsageStatsService._location(usage.end_location),
+                "requests": usage.requests
+            }
+            for usage in PairUsage.objects.select_related('start_location', 'end_location')
+            .order_by('-requests')[:limit]
+        ]
+
+    @staticmethod
+    def top_locations(limit):
+        return [
+            {**UsageStatsService._location(location), "requests": location.popularity}
+            for location in Location.objects.filter(popularity__gt=0).order_by('-popularity')[:limit]
+        ]
+
+    @staticmethod
+    def daily(days):
+        since = timezone.now().date() - timedelta(days=days - 1)
+        return list(
+            DailyUsage.objects.filter(day__gte=since).order_by('day')
+            .values('day', 'requests', 'cache_hits', 'cache_misses', 'upstream_calls')
+        )
+
+    @staticmethod
+    def hot_pairs(limit):
+        """(start_location, end_location) pairs worth keeping warm, hottest first."""
+        return [
+            (usage.start_location, usage.end_location)
+            for usage in PairUsage.objects.select_related('start_location', 'end_location')
+            .order_by('-requests')[:limit]
+        ]
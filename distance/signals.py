@@ -1,9 +1,16 @@
 # signals.py
 from django.contrib.postgres.search import SearchVector
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
+from .geo import geohash_encode
 from .models import Location
 
+@receiver(pre_save, sender=Location)
+def update_geohash(sender, instance, **kwargs):
+    instance.geohash = geohash_encode(instance.latitude, instance.longitude)
+
+
 @receiver(post_save, sender=Location)
 def update_search_vector(sender, instance, created, **kwargs):
     if created:
@@ -12,3 +19,9 @@ def update_search_vector(sender, instance, created, **kwargs):
             SearchVector('address', weight='B')
         )
         instance.save(update_fields=['search_vector'])
+
+
+@receiver(connection_created)
+def reset_prepared_statements(sender, connection, **kwargs):
+    """A new session has none of the statements prepared by ``db.prepare`` yet."""
+    connection.prepared_statements = set()
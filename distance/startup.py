@@ -0,0 +1,136 @@
+# startup.py
+"""
+Process startup: preloading shared state and warming up workers.
+
+- ``preload`` builds the read-only in-memory structures (location index,
+  road graph). Under gunicorn's ``preload_app`` it runs once in the master,
+  so forked workers share those pages copy-on-write.
+- ``warmup`` runs in every worker before it takes traffic: it opens the
+  database connections, the Maps API connection pool and fills the cache
+  for the hottest location pairs from recorded distances.
+
+``/readyz`` reports ready only once ``warmup`` has succeeded in the worker
+answering it. Every step is timed; the timings are logged and shown by
+``/healthz``.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .location_index import get_location_index
+from .providers import LocalRoutingProvider, get_provider
+from .resilience import MAPS_ORIGIN, http_session
+from .services import DistanceService, UsageStatsService
+
+logger = logging.getLogger(__name__)
+
+timings = {}
+state = {'ready': False, 'warming': False, 'error': None}
+_lock = threading.Lock()
+
+
+@contextmanager
+def timed(step):
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[step] = round(time.monotonic() - started, 3)
+        logger.info("startup step %s took %.3fs", step, timings[step])
+
+
+def preload():
+    """Load the shared read-only indexes. Opens no sockets, so it is safe before a fork."""
+    with timed('preload_location_index'):
+        get_location_index()
+    if settings.ROUTING_GRAPH_PATH:
+        with timed('preload_routing_graph'):
+            LocalRoutingProvider.graph()
+
+
+def warm_connections():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def warm_http():
+    try:
+        http_session().head(MAPS_ORIGIN, timeout=settings.MAPS_REQUEST_TIMEOUT)
+    except Exception:
+        # A cold pool only costs the first request a handshake.
+        logger.warning("Could not open a connection to %s", MAPS_ORIGIN, exc_info=True)
+
+
+def warm_cache(limit):
+    """
+    Cache the responses for the ``limit`` most requested pairs that are not
+    cached yet, from their latest recorded distance. Returns the number cached.
+    """
+    # Imported here: the views import this module for /healthz and /readyz.
+    from .views import build_distance_result, cache_result, distance_cache_key, sanitize_input
+
+    pairs = UsageStatsService.hot_pairs(limit)
+    if not pairs:
+        return 0
+    provider = get_provider('google')
+    # Keyed the way calculate_distance looks requests up
+    keys = {
+        pair: distance_cache_key(sanitize_input(pair[0].name), sanitize_input(pair[1].name), provider, False)
+        for pair in pairs
+    }
+    cached = cache.get_many(keys.values())
+    missing = [pair for pair in pairs if keys[pair] not in cached]
+    known = DistanceService.known_distances({location for pair in missing for location in pair})
+
+    warmed = 0
+    for start, end in missing:
+        distance_km = known.get((start.pk, end.pk))
+        if distance_km is not None:
+            result = build_distance_result(start, end, distance_km, provider.service)
+            cache_result(keys[start, end], result, start, end, timeout=3600)
+            warmed += 1
+    return warmed
+
+
+def warmup():
+    """Prepare this worker for traffic. Returns True once it is ready."""
+    with _lock:
+        if state['ready'] or state['warming']:
+            return state['ready']
+        state['warming'] = True
+    try:
+        with timed('warmup'):
+            with timed('warmup_database'):
+                warm_connections()
+            with timed('warmup_http'):
+                warm_http()
+            preload()
+            if settings.STARTUP_WARM_PAIRS:
+                with timed('warmup_cache'):
+                    warm_cache(settings.STARTUP_WARM_PAIRS)
+    except Exception as e:
+        logger.exception("Warmup failed")
+        state['error'] = str(e)
+    else:
+        state.update(ready=True, error=None)
+    finally:
+        state['warming'] = False
+    return state['ready']
+
+
+def warmup_in_background():
+    """Start ``warmup`` without blocking, for servers that do not run the gunicorn hooks."""
+    def run():
+        try:
+            warmup()
+        finally:
+            # Django connections are per thread; don't leave this one's open.
+            connections.close_all()
+
+    if not state['ready'] and not state['warming']:
+        threading.Thread(target=run, name='warmup', daemon=True).start()
@@ -0,0 +1,101 @@
+import json
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from distance import admission
+from distance.admission import CoDel, client_priority, queue_delay
+from distance.middleware import AdmissionControlMiddleware
+
+
+class CoDelTest(SimpleTestCase):
+
+    def test_sheds_after_delay_stays_above_target(self):
+        codel = CoDel(target=0.1, interval=1.0)
+        self.assertFalse(codel.should_shed(0.5, now=0.0))
+        self.assertFalse(codel.should_shed(0.5, now=0.5))
+        self.assertTrue(codel.should_shed(0.5, now=1.0))
+        # Next drop one interval later, then faster
+        self.assertFalse(codel.should_shed(0.5, now=1.5))
+        self.assertTrue(codel.should_shed(0.5, now=2.0))
+        self.assertTrue(codel.should_shed(0.5, now=2.0 + 1 / 2 ** 0.5))
+
+    def test_recovers_below_target(self):
+        codel = CoDel(target=0.1, interval=1.0)
+        codel.should_shed(0.5, now=0.0)
+        self.assertTrue(codel.should_shed(0.5, now=1.0))
+        self.assertFalse(codel.should_shed(0.01, now=1.1))
+        self.assertFalse(codel.should_shed(0.5, now=1.2))
+
+
+@override_settings(API_KEYS={'gold': 'high', 'batch': 'low'}, ADMISSION_MAX_IN_FLIGHT=2)
+class AdmissionControlMiddlewareTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.middleware = AdmissionControlMiddleware(lambda request: HttpResponse("ok"))
+        admission.codel.first_above = None
+        admission.codel.dropping = False
+
+    def get(self, **headers):
+        return self.factory.get('/api/calculate-distance/', {'start': 'a', 'end': 'b'}, **headers)
+
+    def test_queue_delay_units(self):
+        now = time.time()
+        for header in (f"t={now - 2}", str(int((now - 2) * 1000)), str(int((now - 2) * 1e6))):
+            request = self.factory.get('/', HTTP_X_REQUEST_START=header)
+            self.assertAlmostEqual(queue_delay(request), 2, delta=0.1)
+        self.assertEqual(queue_delay(self.factory.get('/', HTTP_X_REQUEST_START='bogus')), 0.0)
+
+    def test_client_priority(self):
+        self.assertEqual(client_priority(self.get(HTTP_X_API_KEY='gold')), 'high')
+        self.assertEqual(client_priority(self.get(HTTP_X_API_KEY='unknown')), 'normal')
+        self.assertEqual(client_priority(self.get()), 'normal')
+
+    def test_releases_slot(self):
+        self.assertEqual(self.middleware(self.get()).status_code, 200)
+        self.assertEqual(admission.in_flight.count(), 0)
+
+    def test_sheds_when_slots_taken(self):
+        admission.in_flight.acquire(2)
+        admission.in_flight.acquire(2)
+        response = self.middleware(self.get())
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(json.loads(response.content)['error']['code'], 'SERVICE_OVERLOADED')
+        # High priority clients are not capped
+        self.assertEqual(self.middleware(self.get(HTTP_X_API_KEY='gold')).status_code, 200)
+
+    def test_release_does_not_go_negative(self):
+        self.assertTrue(admission.in_flight.acquire(2))
+        cache.delete(admission.in_flight.key)  # Expired while the request was in flight
+        self.assertTrue(admission.in_flight.acquire(2))
+        admission.in_flight.release()
+        admission.in_flight.release()
+        self.assertEqual(admission.in_flight.count(), 0)
+        self.assertTrue(admission.in_flight.acquire(1))
+        self.assertFalse(admission.in_flight.acquire(1))
+
+    def test_low_priority_gets_half_the_slots(self):
+        admission.in_flight.acquire(2)
+        self.assertEqual(self.middleware(self.get(HTTP_X_API_KEY='batch')).status_code, 503)
+        self.assertEqual(self.middleware(self.get()).status_code, 200)
+
+    def test_low_priority_shed_on_queue_delay(self):
+        delayed = {'HTTP_X_REQUEST_START': f"t={time.time() - 1}"}
+        self.assertEqual(self.middleware(self.get(HTTP_X_API_KEY='batch', **delayed)).status_code, 503)
+        self.assertEqual(self.middleware(self.get(**delayed)).status_code, 200)
+
+    def test_cache_hits_use_fast_lane(self):
+        cache.set('a_b', {"result": {"status": "success"}, "pair": (1, 2)})
+        with patch('distance.admission.admit', return_value=False) as admit:
+            self.assertEqual(self.middleware(self.get()).status_code, 200)
+        admit.assert_not_called()
+
+    def test_other_views_not_controlled(self):
+        with patch('distance.admission.admit', return_value=False):
+            response = self.middleware(self.factory.get('/api/locations/autocomplete/', {'q': 'ab'}))
+        self.assertEqual(response.status_code, 200)
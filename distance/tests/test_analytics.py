@@ -0,0 +1,86 @@
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from distance.analytics import SpaceSaving, UsageTracker
+from distance.models import DailyUsage, Location, PairUsage
+
+
+class SpaceSavingTest(SimpleTestCase):
+
+    def test_exact_below_capacity(self):
+        sketch = SpaceSaving(3)
+        for key in "aabac":
+            sketch.add(key)
+        self.assertEqual(sketch.top(2), [("a", 3), ("b", 1)])
+
+    def test_eviction_keeps_heavy_hitters(self):
+        sketch = SpaceSaving(2)
+        for key in "aaaaaaaabcdefa":
+            sketch.add(key)
+        self.assertEqual(len(sketch), 2)
+        self.assertEqual(sketch.top(1)[0][0], "a")
+        # Counts never under-estimate, guaranteed counts never over-estimate
+        self.assertGreaterEqual(sketch.top(1)[0][1], 9)
+        self.assertLessEqual(sketch.guaranteed()["a"], 9)
+
+    def test_guaranteed_excludes_inherited_counts(self):
+        sketch = SpaceSaving(1)
+        for key in "aaab":
+            sketch.add(key)
+        self.assertEqual(sketch.top(1), [("b", 4)])
+        self.assertEqual(sketch.guaranteed(), {"b": 1})
+
+
+class UsageTrackerTest(TestCase):
+
+    def setUp(self):
+        self.start_location = Location.objects.create(
+            name="Start Location", address="Start Address", latitude=40.7128, longitude=-74.0060
+        )
+        self.end_location = Location.objects.create(
+            name="End Location", address="End Address", latitude=34.0522, longitude=-118.2437
+        )
+        self.pair = (self.start_location.pk, self.end_location.pk)
+
+    def test_flush_merges_counts(self):
+        for _ in range(2):
+            tracker = UsageTracker()
+            tracker.record_request(cache_hit=False, pair=self.pair)
+            tracker.record_request(cache_hit=True, pair=self.pair)
+            tracker.record_upstream_call()
+            tracker.flush()
+
+        daily = DailyUsage.objects.get(day=timezone.now().date())
+        self.assertEqual((daily.requests, daily.cache_hits, daily.cache_misses, daily.upstream_calls), (4, 2, 2, 2))
+        self.assertEqual(PairUsage.objects.get().requests, 4)
+        self.start_location.refresh_from_db()
+        self.assertEqual(self.start_location.popularity, 4)
+
+    def test_empty_flush_skips_database(self):
+        with self.assertNumQueries(0):
+            UsageTracker().flush()
+
+    def test_deleted_locations_are_skipped(self):
+        tracker = UsageTracker()
+        tracker.record_request(cache_hit=False, pair=(self.start_location.pk, 987654))
+        tracker.flush()
+        self.assertFalse(PairUsage.objects.exists())
+        self.assertEqual(Location.objects.get(popularity__gt=0), self.start_location)
+
+    def test_stats_endpoints(self):
+        tracker = UsageTracker()
+        tracker.record_request(cache_hit=False, pair=self.pair)
+        tracker.flush()
+
+        pairs = self.client.get(reverse('stats_top_pairs'), {'limit': 5}).json()['data']['pairs']
+        self.assertEqual(pairs[0]['start_location']['id'], self.start_location.pk)
+        self.assertEqual(pairs[0]['requests'], 1)
+
+        locations = self.client.get(reverse('stats_top_locations')).json()['data']['locations']
+        self.assertEqual({location['id'] for location in locations}, set(self.pair))
+
+        days = self.client.get(reverse('stats_usage'), {'days': 7}).json()['data']['days']
+        self.assertEqual(days[-1]['cache_misses'], 1)
+
+        response = self.client.get(reverse('stats_usage'), {'days': 0})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from distance.geo import geohash_encode
+from distance.models import Location
+
+
+class GeocodeLocationsCommandTest(TestCase):
+
+    def setUp(self):
+        self.locations = [
+            Location.objects.create(name=f"place {i}", address="Old format", latitude=0, longitude=0)
+            for i in range(3)
+        ]
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'geocode.checkpoint')
+
+    def geocode(self, *args, **options):
+        call_command('geocode_locations', *args, '--qps=1000', f'--checkpoint={self.checkpoint}',
+                     stdout=StringIO(), **options)
+
+    @patch('distance.services.LocationService.geocode_address')
+    def test_geocodes_selected_locations(self, mock_geocode):
+        mock_geocode.side_effect = lambda query, endpoint: (
+            (None, None, None) if query == "place 1" else (f"{query}, New format", 18.5293, 73.9149)
+        )
+        self.geocode('--missing-coordinates', '--batch-size=2')
+
+        location = Location.objects.get(pk=self.locations[0].pk)
+        self.assertEqual(location.address, "place 0, New format")
+        self.assertEqual(location.geohash, geohash_encode(18.5293, 73.9149))
+        self.assertTrue(Location.objects.filter(pk=location.pk, search_vector="format").exists())
+        self.assertEqual(mock_geocode.call_args.kwargs['endpoint'], 'geocode-bulk')
+        # Failed geocodes are retried once, then left unchanged and kept in the checkpoint
+        self.assertEqual([call.args[0] for call in mock_geocode.call_args_list].count("place 1"), 2)
+        self.assertEqual(Location.objects.get(pk=self.locations[1].pk).address, "Old format")
+        with open(self.checkpoint) as checkpoint_file:
+            checkpoint = json.load(checkpoint_file)
+        self.assertEqual(checkpoint['failed'], [self.locations[1].pk])
+        self.assertEqual(checkpoint['last_id'], self.locations[2].pk)
+
+    @patch('distance.services.LocationService.geocode_address')
+    def test_retries_transient_failures(self, mock_geocode):
+        attempts = []
+
+        def geocode(query, endpoint):
+            attempts.append(query)
+            if query == "place 1" and attempts.count(query) == 1:
+                return None, None, None  # e.g. a timeout
+            return f"{query}, New format", 18.5293, 73.9149
+        mock_geocode.side_effect = geocode
+
+        self.geocode('--all', '--batch-size=2')
+
+        self.assertEqual(Location.objects.get(pk=self.locations[1].pk).address, "place 1, New format")
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    @patch('distance.services.LocationService.geocode_address', return_value=("New format", 1.0, 2.0))
+    def test_resumes_from_checkpoint(self, mock_geocode):
+        run = {'all': True, 'ids': None, 'missing_coordinates': False, 'address_contains': None, 'source': 'name'}
+        with open(self.checkpoint, 'w') as checkpoint_file:
+            json.dump({'run': run, 'last_id': self.locations[1].pk, 'failed': [self.locations[0].pk]},
+                      checkpoint_file)
+
+        self.geocode('--all')
+
+        self.assertEqual([call.args[0] for call in mock_geocode.call_args_list], ["place 2", "place 0"])
+
+    @patch('distance.analytics.tracker.flush')
+    @patch('distance.services.LocationService.geocode_address', return_value=("New format", 1.0, 2.0))
+    def test_flushes_usage_counters(self, mock_geocode, mock_flush):
+        self.geocode('--all')
+        mock_flush.assert_called_once()
+
+    def test_requires_a_selection(self):
+        with self.assertRaises(CommandError):
+            self.geocode()
@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+from distance.geo import (
+    Coordinates, geodesic_km, geohash_cells_covering, geohash_encode, haversine_km
+)
+
+
+class GeoTest(SimpleTestCase):
+
+    def test_haversine(self):
+        self.assertAlmostEqual(haversine_km(18.5293, 73.9149, 18.5523, 73.9340), 3.255, places=3)
+
+    def test_geodesic(self):
+        # Land's End to John o' Groats
+        self.assertAlmostEqual(geodesic_km(50.06639, -5.71472, 58.64389, -3.07), 969.954, places=0)
+        self.assertEqual(geodesic_km(10, 10, 10, 10), 0.0)
+
+    def test_geohash_encode(self):
+        self.assertEqual(geohash_encode(57.64911, 10.40744, 11), "u4pruydqqvj")
+
+    def test_cells_cover_radius(self):
+        cells = geohash_cells_covering(18.53, 73.91, 2)
+        self.assertEqual(len(cells), 9)
+        self.assertTrue(geohash_encode(18.53, 73.91).startswith(tuple(cells)))
+        # A point 1.9 km away is inside one of the cells
+        self.assertTrue(geohash_encode(18.547, 73.91).startswith(tuple(cells)))
+
+    def test_huge_radius_covers_everything(self):
+        self.assertEqual(geohash_cells_covering(0, 0, 20000), [])
+
+    def test_coordinates(self):
+        point = Coordinates("18.5293", 73.9149)
+        lat, lng = point
+        self.assertEqual((lat, lng), (18.5293, 73.9149))
+        self.assertEqual(point, Coordinates(18.5293, 73.9149))
+        self.assertEqual(str(point), "18.529300,73.914900")
+        self.assertEqual(point.as_dict(), {"latitude": 18.5293, "longitude": 73.9149})
+        with self.assertRaises(AttributeError):
+            point.name = "no instance dict"
@@ -0,0 +1,76 @@
+import json
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.test import SimpleTestCase, override_settings
+from distanceApp.handlers import ApiWSGIHandler, PathDispatcher
+
+
+def call(app, path, query=None, **headers):
+    environ = {'PATH_INFO': path, 'QUERY_STRING': urlencode(query or {}), 'HTTP_HOST': 'testserver', **headers}
+    setup_testing_defaults(environ)
+    statuses = []
+    response = app(environ, lambda status, response_headers: statuses.append(status))
+    try:
+        body = b''.join(response)
+    finally:
+        # As a WSGI server would: Django's close() fires request_finished, which resets the urlconf.
+        if hasattr(response, 'close'):
+            response.close()
+    return int(statuses[0].split()[0]), body
+
+
+class ApiWSGIHandlerTest(SimpleTestCase):
+
+    def setUp(self):
+        self.handler = ApiWSGIHandler()
+
+    def test_lean_middleware_chain(self):
+        middleware = []
+        handler = self.handler._middleware_chain
+        while hasattr(handler, '__wrapped__'):
+            handler = handler.__wrapped__
+            middleware.append(type(handler).__name__)
+            handler = getattr(handler, 'get_response', None)
+        self.assertNotIn('SessionMiddleware', middleware)
+        self.assertNotIn('CsrfViewMiddleware', middleware)
+        self.assertIn('AdmissionControlMiddleware', middleware)
+
+    def test_serves_api_views(self):
+        status, body = call(self.handler, '/api/stats/usage/', {'days': 0})
+        self.assertEqual(status, 400)
+        self.assertEqual(json.loads(body)['error']['code'], 'INVALID_PARAMETERS')
+
+    def test_appends_slash(self):
+        environ = {'PATH_INFO': '/api/calculate-distance', 'QUERY_STRING': 'start=a&end=b', 'HTTP_HOST': 'testserver'}
+        setup_testing_defaults(environ)
+        response = self.handler(environ, lambda status, response_headers: None)
+        response.close()
+        self.assertEqual(response.status_code, 301)
+        self.assertEqual(response['Location'], '/api/calculate-distance/?start=a&end=b')
+
+    def test_admin_not_routed(self):
+        status, _ = call(self.handler, '/admin/')
+        self.assertEqual(status, 404)
+
+    @override_settings(API_KEY_REQUIRED=True, API_KEYS={'secret': 'normal'})
+    def test_api_key_required(self):
+        status, body = call(self.handler, '/api/stats/usage/', {'days': 0})
+        self.assertEqual(status, 401)
+        self.assertEqual(json.loads(body)['error']['code'], 'UNAUTHORIZED')
+        status, _ = call(self.handler, '/api/stats/usage/', {'days': 0}, HTTP_X_API_KEY='secret')
+        self.assertEqual(status, 400)
+
+
+class PathDispatcherTest(SimpleTestCase):
+
+    def test_dispatch_by_prefix(self):
+        def app(name):
+            def wsgi_app(environ, start_response):
+                start_response('200 OK', [])
+                return [name.encode()]
+            return wsgi_app
+
+        dispatcher = PathDispatcher(app('full'), app('api'))
+        self.assertEqual(call(dispatcher, '/api/calculate-distance/')[1], b'api')
+        self.assertEqual(call(dispatcher, '/admin/')[1], b'full')
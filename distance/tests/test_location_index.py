@@ -0,0 +1,76 @@
+import os
+import tempfile
+from django.test import SimpleTestCase, TestCase
+from distance.location_index import LocationIndex, build_snapshot, trigrams, write_snapshot
+from distance.models import Location
+
+ROWS = [
+    (1, "Upper Kharadi Main Rd, Pune", "Upper Kharadi Main Rd, Ubale Nagar, Pune", 18.5293, 73.9149),
+    (2, "HX64+CJW, Pune", "HX64+CJW, Grant Rd, Kharadi, Pune", 18.5523, 73.9340),
+    (7, "walt disney concert hall", "111 S Grand Ave, Los Angeles", 34.055, -118.249),
+]
+
+
+class LocationIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.idx')
+        os.close(handle)
+        write_snapshot(self.path, ROWS)
+        self.index = LocationIndex(self.path)
+
+    def tearDown(self):
+        self.index.close()
+        os.remove(self.path)
+
+    def test_trigrams_match_pg_trgm(self):
+        self.assertEqual(trigrams("Cat"), {"  c", " ca", "cat", "at "})
+
+    def test_snapshot_round_trip(self):
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual(self.index.max_id, 7)
+        self.assertEqual(list(self.index.rows())[2],
+                         (7, "walt disney concert hall", "111 S Grand Ave, Los Angeles", 34.055, -118.249))
+
+    def test_exact_lookup(self):
+        location = self.index.lookup("  Walt Disney Concert Hall ", min_similarity=0.8)
+        self.assertEqual(location.pk, 7)
+        self.assertEqual(location.address, "111 S Grand Ave, Los Angeles")
+        self.assertEqual(location.latitude, 34.055)
+
+    def test_near_exact_lookup(self):
+        self.assertEqual(self.index.lookup("upper kharadi main road, pune", min_similarity=0.6).pk, 1)
+        self.assertIsNone(self.index.lookup("disney hall", min_similarity=0.8))
+
+
+class BuildSnapshotTest(TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.idx')
+        os.close(handle)
+        os.remove(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_incremental_build(self):
+        Location.objects.create(name="first", address="First St", latitude=1, longitude=2)
+        self.assertEqual(build_snapshot(self.path), 1)
+        Location.objects.create(name="second", address="Second St", latitude=3, longitude=4)
+        self.assertEqual(build_snapshot(self.path), 2)
+        index = LocationIndex(self.path)
+        self.assertEqual([row[1] for row in index.rows()], ["first", "second"])
+        index.close()
+
+    def test_rebuilds_after_update_or_delete(self):
+        first = Location.objects.create(name="first", address="First St", latitude=1, longitude=2)
+        second = Location.objects.create(name="second", address="Second St", latitude=3, longitude=4)
+        build_snapshot(self.path)
+
+        Location.objects.filter(pk=first.pk).update(latitude=5)  # Re-geocoded
+        second.delete()
+        self.assertEqual(build_snapshot(self.path), 1)
+        index = LocationIndex(self.path)
+        self.assertEqual(list(index.rows()), [(first.pk, "first", "First St", 5.0, 2.0)])
+        self.assertIsNone(index.lookup("second", min_similarity=0.8))
+        index.close()
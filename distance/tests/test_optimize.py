@@ -0,0 +1,58 @@
+import itertools
+import math
+from django.test import SimpleTestCase
+from distance.optimize import optimize_route
+
+
+def route_length(matrix, order):
+    return sum(matrix[a][b] for a, b in zip(order, order[1:]))
+
+
+# Stops on a line at 0, 5, 1, 4, 2, 3 km
+POSITIONS = [0, 5, 1, 4, 2, 3]
+LINE_MATRIX = [[abs(a - b) for b in POSITIONS] for a in POSITIONS]
+
+
+class OptimizeRouteTest(SimpleTestCase):
+
+    def test_open_route(self):
+        order, total = optimize_route(LINE_MATRIX)
+        self.assertEqual(order, [0, 2, 4, 5, 3, 1])
+        self.assertEqual(total, 5)
+
+    def test_round_trip(self):
+        order, total = optimize_route(LINE_MATRIX, round_trip=True)
+        self.assertEqual(order[0], 0)
+        self.assertEqual(order[-1], 0)
+        self.assertEqual(sorted(order[:-1]), list(range(6)))
+        self.assertEqual(total, 10)
+
+    def test_improves_nearest_neighbor_to_optimum(self):
+        # Nearest neighbour from the first point gives 46.179 km here
+        points = [(18, 14), (4, 11), (3, 1), (4, 15), (6, 8), (13, 20), (9, 13)]
+        matrix = [[math.dist(a, b) for b in points] for a in points]
+        best = min(
+            route_length(matrix, (0,) + rest)
+            for rest in itertools.permutations(range(1, len(points)))
+        )
+        order, total = optimize_route(matrix)
+        self.assertEqual(sorted(order), list(range(len(points))))
+        self.assertAlmostEqual(total, route_length(matrix, order))
+        self.assertAlmostEqual(total, best)
+
+    def test_asymmetric_matrix(self):
+        matrix = [
+            [0, 7, 3, 9, 4],
+            [2, 0, 8, 1, 6],
+            [5, 4, 0, 7, 2],
+            [8, 3, 6, 0, 5],
+            [1, 9, 2, 4, 0],
+        ]
+        order, total = optimize_route(matrix)
+        self.assertEqual(order[0], 0)
+        self.assertEqual(sorted(order), list(range(5)))
+        self.assertEqual(total, route_length(matrix, order))
+        self.assertLessEqual(total, 12)  # nearest neighbour length
+
+    def test_single_stop(self):
+        self.assertEqual(optimize_route([[0]]), ([0], 0.0))
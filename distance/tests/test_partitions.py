@@ -0,0 +1,100 @@
+from datetime import datetime, time, timedelta
+from django.test import TestCase
+from django.utils import timezone
+from distance import partitions
+from distance.models import DistanceRecord, DistanceRecordDailyRollup, Location, RollupWatermark
+from distance.services import DistanceService
+
+
+class PartitionMaintenanceTest(TestCase):
+
+    def setUp(self):
+        self.start_location = Location.objects.create(
+            name="Start Location", address="Start Address", latitude=40.7128, longitude=-74.0060
+        )
+        self.end_location = Location.objects.create(
+            name="End Location", address="End Address", latitude=34.0522, longitude=-118.2437
+        )
+
+    def test_add_months(self):
+        this_month = timezone.now().date().replace(day=1)
+        self.assertEqual(partitions.add_months(this_month, 12).month, this_month.month)
+        self.assertEqual(partitions.add_months(this_month.replace(month=12), 1).month, 1)
+
+    def test_ensure_partitions(self):
+        this_month = timezone.now().date().replace(day=1)
+        partitions.ensure_partitions(6)
+        months = partitions.partition_months()
+        for offset in range(7):
+            self.assertIn(partitions.add_months(this_month, offset), months)
+        self.assertEqual(partitions.ensure_partitions(6), [])
+
+    def test_ensure_partitions_moves_rows_from_default(self):
+        this_month = timezone.now().date().replace(day=1)
+        late_month = partitions.add_months(this_month, -30)
+        record = DistanceRecord.objects.create(
+            start_location=self.start_location, end_location=self.end_location, distance_km=1.0
+        )
+        # Written while the month had no partition
+        DistanceRecord.objects.filter(pk=record.pk).update(
+            created_at=timezone.make_aware(datetime.combine(late_month, time.min)) + timedelta(days=2)
+        )
+
+        self.assertIn(late_month, partitions.ensure_partitions(6))
+        with partitions._connection().cursor() as cursor:
+            cursor.execute(f"SELECT tableoid::regclass::text FROM {partitions.PARENT_TABLE} WHERE id = %s",
+                           [record.pk])
+            self.assertEqual(cursor.fetchone()[0], partitions.partition_name(late_month))
+            cursor.execute(f"SELECT COUNT(*) FROM {partitions.DEFAULT_PARTITION}")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+    def test_rollup(self):
+        DistanceService.save_distance_record(self.start_location, self.end_location, 3930.0)
+        DistanceService.save_distance_record(self.start_location, self.end_location, 3931.0)
+        self.assertEqual(partitions.rollup(), 1)
+        rollup = DistanceRecordDailyRollup.objects.get()
+        self.assertEqual(rollup.day, DistanceRecord.objects.first().created_at.date())
+        self.assertEqual(rollup.records, 2)
+        self.assertEqual(rollup.latest_distance_km, 3931)
+        self.assertEqual(partitions.rolled_up_through(), timezone.now().date() - timedelta(days=1))
+
+    def test_rollup_resumes_after_watermark(self):
+        RollupWatermark.objects.create(day=timezone.now().date() - timedelta(days=1))
+        DistanceService.save_distance_record(self.start_location, self.end_location, 3930.0)
+        self.assertEqual(partitions.rollup(), 1)
+        self.assertEqual(DistanceRecordDailyRollup.objects.get().day, timezone.now().date())
+
+    def create_old_record(self, old_month):
+        with partitions._connection().cursor() as cursor:
+            cursor.execute(partitions.create_partition_sql(old_month))
+        old_record = DistanceRecord.objects.create(
+            start_location=self.start_location, end_location=self.end_location, distance_km=1.0
+        )
+        DistanceRecord.objects.filter(pk=old_record.pk).update(
+            created_at=timezone.make_aware(datetime.combine(old_month, time.min))
+            + timedelta(days=3)
+        )
+        with partitions._connection().cursor() as cursor:
+            # Fire the deferred FK checks now; a table with pending trigger events can't be dropped.
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        return old_record
+
+    def test_drop_expired_partitions(self):
+        old_month = partitions.add_months(timezone.now().date().replace(day=1), -14)
+        old_record = self.create_old_record(old_month)
+        partitions.rollup(since=old_month)
+
+        self.assertEqual(partitions.drop_expired_partitions(12), [old_month])
+        self.assertFalse(DistanceRecord.objects.filter(pk=old_record.pk).exists())
+        self.assertTrue(DistanceRecordDailyRollup.objects.filter(day__lt=timezone.now().date()).exists())
+
+    def test_keeps_partitions_behind_watermark(self):
+        old_month = partitions.add_months(timezone.now().date().replace(day=1), -14)
+        old_record = self.create_old_record(old_month)
+        self.assertEqual(partitions.drop_expired_partitions(12), [])
+
+        # Rolling up from after the record skips its day: the watermark must not move.
+        partitions.rollup(since=old_month + timedelta(days=10))
+        self.assertIsNone(partitions.rolled_up_through())
+        self.assertEqual(partitions.drop_expired_partitions(12), [])
+        self.assertTrue(DistanceRecord.objects.filter(pk=old_record.pk).exists())
@@ -0,0 +1,76 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch
+import requests
+from distance.resilience import (
+    CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded, RateLimiter, guarded_get
+)
+
+
+@override_settings(MAPS_BREAKER_FAILURE_THRESHOLD=2, MAPS_BREAKER_RESET_TIMEOUT=30,
+                   MAPS_REQUEST_TIMEOUT=5, MAPS_HEDGE_AFTER=None)
+class CircuitBreakerTest(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.breaker = CircuitBreaker('test')
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_half_open_allows_single_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with patch('distance.resilience.time.time', return_value=cache.get(self.breaker.opened_at_key) + 31):
+            self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+            self.assertTrue(self.breaker.allow_request())
+            self.assertFalse(self.breaker.allow_request())
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+
+    @patch('requests.Session.get')
+    def test_guarded_get_fails_fast_when_open(self, mock_get):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        with self.assertRaises(CircuitOpenError):
+            guarded_get('test', 'https://example.com')
+        mock_get.assert_not_called()
+
+    @patch('requests.Session.get', side_effect=requests.exceptions.ConnectTimeout)
+    def test_guarded_get_records_failures(self, mock_get):
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.RequestException):
+                guarded_get('test', 'https://example.com')
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+
+@override_settings(MAPS_REQUEST_TIMEOUT=5)
+class DeadlineTest(SimpleTestCase):
+
+    def test_timeout_is_capped_per_call(self):
+        self.assertEqual(Deadline(30).timeout(), 5)
+
+    def test_timeout_keeps_reserve(self):
+        self.assertLessEqual(Deadline(3).timeout(reserve=2), 1)
+
+    def test_exhausted_budget_raises(self):
+        with self.assertRaises(DeadlineExceeded):
+            Deadline(1).timeout(reserve=2)
+
+
+class RateLimiterTest(SimpleTestCase):
+
+    @patch('distance.resilience.time.sleep')
+    def test_waits_for_tokens(self, mock_sleep):
+        limiter = RateLimiter(rate=10, burst=2)
+        with patch('distance.resilience.time.monotonic', return_value=limiter.updated_at):
+            limiter.acquire()
+            limiter.acquire()
+            mock_sleep.assert_not_called()
+            limiter.acquire()
+            limiter.acquire()
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [0.1, 0.2])
@@ -0,0 +1,59 @@
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch
+from django.db import DatabaseError
+from distance import routers
+from distance.models import Location
+from distance.routers import ReplicaRouter
+
+
+@override_settings(DATABASE_REPLICAS=['replica0'], DATABASE_REPLICA_MAX_LAG=5,
+                   DATABASE_REPLICA_CHECK_INTERVAL=0)
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        routers.unpin()
+        routers._health.update(checked_at=0.0, replicas=[], checking_pid=None)
+        # Checks run inline here, through check_replicas
+        thread_patcher = patch('distance.routers.threading.Thread')
+        self.mock_thread = thread_patcher.start()
+        self.addCleanup(thread_patcher.stop)
+
+    def tearDown(self):
+        routers.unpin()
+        routers._health.update(checked_at=0.0, replicas=[], checking_pid=None)
+
+    @patch('distance.routers.replica_lag', return_value=0.5)
+    def test_reads_go_to_replica(self, mock_lag):
+        routers.check_replicas()
+        self.assertEqual(self.router.db_for_read(Location), 'replica0')
+
+    @patch('distance.routers.replica_lag', return_value=0.5)
+    def test_reads_after_write_stay_on_primary(self, mock_lag):
+        routers.check_replicas()
+        self.assertEqual(self.router.db_for_write(Location), 'default')
+        self.assertEqual(self.router.db_for_read(Location), 'default')
+
+    @patch('distance.routers.replica_lag', return_value=60)
+    def test_lagging_replica_falls_back_to_primary(self, mock_lag):
+        routers.check_replicas()
+        self.assertEqual(self.router.db_for_read(Location), 'default')
+
+    @patch('distance.routers.replica_lag', side_effect=DatabaseError)
+    def test_unreachable_replica_falls_back_to_primary(self, mock_lag):
+        routers.check_replicas()
+        self.assertEqual(self.router.db_for_read(Location), 'default')
+
+    @patch('distance.routers.replica_lag')
+    def test_stale_check_runs_in_background(self, mock_lag):
+        routers._health['replicas'] = ['replica0']
+        self.assertEqual(self.router.db_for_read(Location), 'replica0')
+        self.assertEqual(self.router.db_for_read(Location), 'replica0')
+        # Requests never probe, and only one check is started at a time
+        mock_lag.assert_not_called()
+        self.mock_thread.assert_called_once()
+        self.mock_thread.return_value.start.assert_called_once()
+
+    def test_only_primary_is_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'distance'))
+        self.assertFalse(self.router.allow_migrate('replica0', 'distance'))
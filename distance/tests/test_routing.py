@@ -0,0 +1,71 @@
+import os
+import tempfile
+from django.test import SimpleTestCase, override_settings
+from distance.models import Location
+from distance.providers import LocalRoutingProvider, get_provider
+from distance.routing import RoadGraph
+
+SAMPLE_GRAPH = """\
+# Small sample road graph around Kharadi, Pune
+N a 18.5000 73.9000
+N b 18.5000 73.9100
+N c 18.5100 73.9100
+N d 18.5100 73.9000
+N e 18.4950 73.9000
+E a b 1100
+E b c 1200
+E c d 1100
+E a d 1150
+E a e 600 oneway
+"""
+
+
+class RoadGraphTest(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        handle, cls.path = tempfile.mkstemp(suffix='.graph')
+        with os.fdopen(handle, 'w') as graph_file:
+            graph_file.write(SAMPLE_GRAPH)
+        cls.graph = RoadGraph.load(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        os.remove(cls.path)
+        LocalRoutingProvider._graph = None
+        super().tearDownClass()
+
+    def test_csr_layout(self):
+        self.assertEqual(len(self.graph), 5)
+        self.assertEqual(len(self.graph.offsets), 6)
+        # 4 two-way edges and 1 one-way edge
+        self.assertEqual(len(self.graph.targets), 9)
+
+    def test_shortest_path(self):
+        # a -> d -> c (2250 m) beats a -> b -> c (2300 m)
+        self.assertEqual(self.graph.shortest_path_m(0, 2), 2250)
+
+    def test_oneway_edges(self):
+        self.assertEqual(self.graph.shortest_path_m(0, 4), 600)
+        self.assertIsNone(self.graph.shortest_path_m(4, 0))
+
+    def test_nearest_node(self):
+        node, km = self.graph.nearest_node(18.5099, 73.9101, max_km=1.0)
+        self.assertEqual(node, 2)
+        self.assertLess(km, 0.05)
+        self.assertEqual(self.graph.nearest_node(19.0, 74.0, max_km=1.0), (None, None))
+
+    def test_distance_km(self):
+        self.assertEqual(self.graph.distance_km(18.5, 73.9, 18.51, 73.91, max_snap_km=1.0), 2.25)
+        self.assertIsNone(self.graph.distance_km(18.5, 73.9, 19.0, 74.0, max_snap_km=1.0))
+
+    def test_local_provider(self):
+        LocalRoutingProvider._graph = None
+        start = Location(latitude=18.5, longitude=73.9)
+        end = Location(latitude=18.51, longitude=73.91)
+        with override_settings(ROUTING_GRAPH_PATH=self.path, ROUTING_MAX_SNAP_KM=1.0):
+            self.assertEqual(get_provider('local').distance(start, end), 2.25)
+
+    def test_unknown_provider(self):
+        self.assertIsNone(get_provider('carrier-pigeon'))
@@ -1,12 +1,14 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
 from unittest.mock import patch
-from distance.services import LocationService, DistanceService
-from distance.models import Location, DistanceRecord
+from distance.geo import haversine_km
+from distance.services import ApproxDistanceService, LocationService, DistanceService
+from distance.models import CellPairDistance, Location, DistanceRecord
 from django.contrib.postgres.search import SearchQuery, SearchVector, SearchRank
 
 class LocationServiceTest(TestCase):
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_geocode_address(self, mock_get):
         mock_get.return_value.json.return_value = {
             'results': [{
@@ -24,7 +26,7 @@ class LocationServiceTest(TestCase):
         self.assertEqual(lat, 40.7128)
         self.assertEqual(lng, -74.0060)
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_calculate_distance(self, mock_get):
         mock_get.return_value.json.return_value = {
             'rows': [{
@@ -38,6 +40,7 @@ class LocationServiceTest(TestCase):
         }
         distance_km = LocationService.calculate_distance(40.7128, -74.0060, 34.0522, -118.2437)
         self.assertEqual(distance_km, 3930.0)
+        self.assertIn("origins=40.712800,-74.006000&destinations=34.052200,-118.243700", mock_get.call_args.args[0])
 
     def test_search_rank_functionality(self):
         # Test if the SearchRank annotation works as expected within the LocationService
@@ -79,6 +82,11 @@ class DistanceServiceTest(TestCase):
             longitude=-118.2437
         )
 
+    def test_find_location(self):
+        location = DistanceService.find_location("start location")
+        self.assertEqual(location, self.start_location)
+        self.assertIsNone(DistanceService.find_location("zzzz qqqq"))
+
     def test_get_or_create_location(self):
         location = DistanceService.get_or_create_location(
             "New Location", "New Address", 37.7749, -122.4194)
@@ -94,6 +102,30 @@ class DistanceServiceTest(TestCase):
         self.assertEqual(record.end_location, self.end_location)
         self.assertEqual(record.distance_km, 3930.0)
 
+    @override_settings(DATABASE_PREPARED_STATEMENTS=True)
+    def test_find_location_prepared(self):
+        location = DistanceService.find_location("start location")
+        self.assertEqual(location, self.start_location)
+        self.assertIsNone(DistanceService.find_location("zzzz qqqq"))
+
+    @override_settings(DATABASE_PREPARED_STATEMENTS=True)
+    def test_find_location_prepared_after_column_type_change(self):
+        self.assertEqual(DistanceService.find_location("start location"), self.start_location)
+        with connection.cursor() as cursor:
+            # As a migration altering a returned column would
+            cursor.execute("ALTER TABLE distance_location ALTER COLUMN latitude TYPE numeric(9, 6)")
+        self.assertEqual(DistanceService.find_location("start location"), self.start_location)
+
+    @override_settings(DATABASE_PREPARED_STATEMENTS=True)
+    def test_save_distance_record_prepared(self):
+        DistanceService.save_distance_record(self.start_location, self.end_location, 3930.0)
+        DistanceService.save_distance_record(self.end_location, self.start_location, 3931.5)
+        records = DistanceRecord.objects.order_by('pk')
+        self.assertEqual(
+            [(r.start_location, r.end_location, r.distance_km) for r in records],
+            [(self.start_location, self.end_location, 3930.0), (self.end_location, self.start_location, 3931.5)]
+        )
+
     def test_similarity_functionality(self):
         # Test that the service creates a new location for a slightly different name
         location = DistanceService.get_or_create_location(
@@ -102,3 +134,42 @@ class DistanceServiceTest(TestCase):
         self.assertNotEqual(location, self.start_location)  # Ensure it creates a new Location
         self.assertEqual(location.name, "Staat Locatin")
         self.assertEqual(location.address, "Strt Adress")
+
+
+@override_settings(APPROX_GEOHASH_PRECISION=5, APPROX_MIN_SAMPLES=2, APPROX_MIN_STRAIGHT_KM=0.5)
+class ApproxDistanceServiceTest(TestCase):
+
+    def setUp(self):
+        self.start_location = Location.objects.create(
+            name="Kharadi", address="Kharadi, Pune", latitude=18.5523, longitude=73.9340
+        )
+        self.end_location = Location.objects.create(
+            name="Hinjewadi", address="Hinjewadi, Pune", latitude=18.5913, longitude=73.7389
+        )
+        self.straight_km = haversine_km(18.5523, 73.9340, 18.5913, 73.7389)
+
+    def test_unknown_cell_pair(self):
+        self.assertIsNone(ApproxDistanceService.estimate(self.start_location, self.end_location))
+
+    def test_skipped_records_are_not_read_again(self):
+        DistanceService.save_distance_record(self.start_location, self.start_location, 0.0)
+        self.assertEqual(ApproxDistanceService.rebuild(), 1)
+        self.assertFalse(CellPairDistance.objects.exists())
+        # Too short to learn from, but not read again
+        self.assertEqual(ApproxDistanceService.rebuild(), 0)
+        self.assertEqual(ApproxDistanceService.rebuild(full=True), 1)
+
+    def test_learns_ratio_incrementally(self):
+        DistanceService.save_distance_record(self.start_location, self.end_location, self.straight_km * 1.2)
+        self.assertEqual(ApproxDistanceService.rebuild(), 1)
+        # One sample is not enough
+        self.assertIsNone(ApproxDistanceService.estimate(self.start_location, self.end_location))
+
+        DistanceService.save_distance_record(self.start_location, self.end_location, self.straight_km * 1.4)
+        self.assertEqual(ApproxDistanceService.rebuild(), 1)
+        self.assertEqual(CellPairDistance.objects.get().samples, 2)
+
+        # Either direction uses the learned pair
+        distance_km, error_bound_km = ApproxDistanceService.estimate(self.end_location, self.start_location)
+        self.assertAlmostEqual(distance_km, self.straight_km * 1.3, places=2)
+        self.assertAlmostEqual(error_bound_km, self.straight_km * 2 * 0.1414, places=1)
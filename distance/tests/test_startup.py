@@ -0,0 +1,78 @@
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from distance import startup
+from distance.models import DistanceRecord, Location, PairUsage
+
+
+class StartupTest(SimpleTestCase):
+
+    def setUp(self):
+        startup.state.update(ready=False, warming=False, error=None)
+
+    def tearDown(self):
+        startup.state.update(ready=False, warming=False, error=None)
+
+    @patch('distance.startup.warm_cache')
+    @patch('distance.startup.preload')
+    @patch('distance.startup.warm_http')
+    @patch('distance.startup.warm_connections')
+    def test_warmup_marks_ready(self, mock_connections, mock_http, mock_preload, mock_cache):
+        self.assertTrue(startup.warmup())
+        mock_connections.assert_called_once()
+        mock_cache.assert_called_once()
+        self.assertIn('warmup_database', startup.timings)
+        # Later calls do nothing
+        self.assertTrue(startup.warmup())
+        mock_connections.assert_called_once()
+
+    @patch('distance.startup.warm_http')
+    @patch('distance.startup.warm_connections', side_effect=RuntimeError("database unavailable"))
+    def test_failed_warmup_is_not_ready(self, mock_connections, mock_http):
+        self.assertFalse(startup.warmup())
+        self.assertEqual(startup.state['error'], "database unavailable")
+        self.assertFalse(startup.state['warming'])
+
+    @patch('distance.startup.warmup_in_background')
+    def test_readyz(self, mock_background):
+        response = self.client.get(reverse('readyz'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['error']['code'], 'NOT_READY')
+        mock_background.assert_called_once()
+
+        startup.state['ready'] = True
+        self.assertEqual(self.client.get(reverse('readyz')).status_code, 200)
+
+    def test_healthz(self):
+        startup.timings['django_setup'] = 0.5
+        response = self.client.get(reverse('healthz'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['startup_timings']['django_setup'], 0.5)
+
+
+class WarmCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.start_location = Location.objects.create(
+            name="Start Location", address="Start Address", latitude=40.7128, longitude=-74.0060
+        )
+        self.end_location = Location.objects.create(
+            name="End Location", address="End Address", latitude=34.0522, longitude=-118.2437
+        )
+        PairUsage.objects.create(start_location=self.start_location, end_location=self.end_location, requests=5)
+        DistanceRecord.objects.create(
+            start_location=self.start_location, end_location=self.end_location, distance_km=3930.0
+        )
+
+    @patch('distance.services.LocationService.calculate_distance')
+    def test_hot_pairs_served_from_cache(self, mock_calculate_distance):
+        self.assertEqual(startup.warm_cache(10), 1)
+        self.assertEqual(startup.warm_cache(10), 0)
+
+        response = self.client.get(reverse('calculate_distance'), {'start': ' start LOCATION', 'end': 'End Location'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['route']['distance']['value'], 3930.0)
+        mock_calculate_distance.assert_not_called()
@@ -1,7 +1,14 @@
-from django.test import TestCase, Client
+import os
+import tempfile
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from unittest.mock import patch
 from datetime import datetime
+from django.core.cache import cache
+from distance.models import CellPairDistance, DistanceRecord, Location
+from distance import location_index
+from distance.analytics import UsageTracker
+from distance.services import ApproxDistanceService
 
 class DistanceViewTest(TestCase):
 
@@ -105,6 +112,15 @@ class DistanceViewTest(TestCase):
             }
         })
 
+    def test_calculate_distance_view_unknown_provider(self):
+        response = self.client.get(reverse('calculate_distance'), {
+            'start': 'Start Location',
+            'end': 'End Location',
+            'provider': 'unknown'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error']['code'], "INVALID_PARAMETERS")
+
     @patch('distance.services.LocationService.geocode_address')
     def test_calculate_distance_view_geocoding_failure(self, mock_geocode_address):
         # Mock geocoding to return None indicating failure
@@ -205,3 +221,245 @@ class DistanceViewTest(TestCase):
         self.assertEqual(actual_response['data'], expected_response['data'])
         self.assertEqual(actual_response['metadata']['service'], expected_response['metadata']['service'])
 
+    @override_settings(MAPS_FALLBACK_MODE='straight_line', MAPS_FALLBACK_ROAD_FACTOR=1.0)
+    @patch('distance.services.LocationService.geocode_address')
+    @patch('distance.services.LocationService.calculate_distance')
+    def test_calculate_distance_view_straight_line_fallback(self, mock_calculate_distance, mock_geocode_address):
+        mock_geocode_address.side_effect = [
+            ("Fallback Start", 18.5293, 73.9149),
+            ("Fallback End", 18.5523, 73.9340)
+        ]
+        mock_calculate_distance.return_value = None  # Upstream unavailable
+
+        response = self.client.get(reverse('calculate_distance'), {
+            'start': 'Fallback Start',
+            'end': 'Fallback End'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        actual_response = response.json()
+        self.assertEqual(actual_response['metadata']['service'], "Straight-line estimate")
+        self.assertAlmostEqual(actual_response['data']['route']['distance']['value'], 3.255, places=3)
+        self.assertEqual(DistanceRecord.objects.count(), 0)
+
+    @override_settings(ROUTING_GRAPH_PATH='roads.graph')
+    @patch('distance.providers.LocalRoutingProvider.distance')
+    @patch('distance.services.LocationService.geocode_address')
+    def test_calculate_distance_view_local_provider_not_recorded(self, mock_geocode_address, mock_local_distance):
+        mock_geocode_address.side_effect = [
+            ("Local Start", 18.5293, 73.9149),
+            ("Local End", 18.5523, 73.9340)
+        ]
+        mock_local_distance.return_value = 3.7
+
+        response = self.client.get(reverse('calculate_distance'), {
+            'start': 'Local Start',
+            'end': 'Local End',
+            'provider': 'local'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['metadata']['service'], "Local routing engine")
+        self.assertEqual(response.json()['data']['route']['distance']['value'], 3.7)
+        # Recorded distances are read back as Google Maps distances
+        self.assertEqual(DistanceRecord.objects.count(), 0)
+
+    @patch('distance.services.LocationService.calculate_distance')
+    def test_calculate_distance_view_location_deleted_since_snapshot(self, mock_calculate_distance):
+        cache.clear()
+        start = Location.objects.create(name="kharadi", address="Kharadi, Pune", latitude=18.5523, longitude=73.9340)
+        Location.objects.create(name="hinjewadi", address="Hinjewadi, Pune", latitude=18.5913, longitude=73.7389)
+        handle, path = tempfile.mkstemp(suffix='.idx')
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        location_index.build_snapshot(path, full=True)
+        start.delete()
+        mock_calculate_distance.return_value = 27.4
+
+        location_index._current.update(index=None, checked_at=0.0)
+        self.addCleanup(location_index._current.update, index=None, checked_at=0.0)
+        with override_settings(LOCATION_INDEX_PATH=path):
+            response = self.client.get(reverse('calculate_distance'), {'start': 'Kharadi', 'end': 'Hinjewadi'})
+
+        # Answered from the snapshot, but not recorded against the deleted location
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['data']['route']['distance']['value'], 27.4)
+        self.assertEqual(DistanceRecord.objects.count(), 0)
+
+    @override_settings(ROUTING_GRAPH_PATH='', MAPS_FALLBACK_MODE='straight_line')
+    def test_calculate_distance_view_local_provider_without_graph(self):
+        response = self.client.get(reverse('calculate_distance'), {
+            'start': 'Local Start',
+            'end': 'Local End',
+            'provider': 'local'
+        })
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error']['code'], "INVALID_PARAMETERS")
+        self.assertEqual(response.json()['error']['message'], "Unknown distance provider.")
+
+    @override_settings(APPROX_GEOHASH_PRECISION=5, APPROX_MIN_SAMPLES=2)
+    @patch('distance.services.LocationService.calculate_distance')
+    def test_calculate_distance_view_approx(self, mock_calculate_distance):
+        cache.clear()
+        start = Location.objects.create(name="kharadi", address="Kharadi, Pune", latitude=18.5523, longitude=73.9340)
+        end = Location.objects.create(name="hinjewadi", address="Hinjewadi, Pune", latitude=18.5913, longitude=73.7389)
+        start_cell, end_cell = ApproxDistanceService.cells(start, end)
+        CellPairDistance.objects.create(start_cell=start_cell, end_cell=end_cell, samples=4,
+                                        mean_ratio=1.3, ratio_m2=0.03)
+
+        response = self.client.get(reverse('calculate_distance'), {
+            'start': 'Kharadi', 'end': 'Hinjewadi', 'approx': 'true'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['metadata']['service'], "Geohash cell-pair estimate")
+        self.assertTrue(data['data']['route']['distance']['approximate'])
+        self.assertEqual(
+            (data['data']['route']['distance']['value'], data['data']['route']['distance']['error_bound']),
+            ApproxDistanceService.estimate(start, end)
+        )
+        mock_calculate_distance.assert_not_called()
+        self.assertEqual(DistanceRecord.objects.count(), 0)
+        # Cached apart from the exact answer
+        self.assertEqual(cache.get("kharadi_hinjewadi_approx")["result"], data)
+        self.assertIsNone(cache.get("kharadi_hinjewadi"))
+
+    @override_settings(APPROX_GEOHASH_PRECISION=5, APPROX_MIN_SAMPLES=2)
+    @patch('distance.services.LocationService.calculate_distance')
+    def test_calculate_distance_view_approx_falls_back_to_exact(self, mock_calculate_distance):
+        cache.clear()
+        Location.objects.create(name="kharadi", address="Kharadi, Pune", latitude=18.5523, longitude=73.9340)
+        Location.objects.create(name="hinjewadi", address="Hinjewadi, Pune", latitude=18.5913, longitude=73.7389)
+        mock_calculate_distance.return_value = 27.4  # No cell-pair data yet
+
+        response = self.client.get(reverse('calculate_distance'), {
+            'start': 'Kharadi', 'end': 'Hinjewadi', 'approx': 'true'
+        })
+
+        self.assertEqual(response.status_code, 200)
+        distance = response.json()['data']['route']['distance']
+        self.assertEqual(distance['value'], 27.4)
+        self.assertNotIn('approximate', distance)
+        self.assertEqual(response.json()['metadata']['service'], "Google Maps API")
+        mock_calculate_distance.assert_called_once()
+        self.assertEqual(DistanceRecord.objects.count(), 1)
+
+
+class NearbyLocationsViewTest(TestCase):
+
+    def setUp(self):
+        self.kharadi = Location.objects.create(
+            name="kharadi depot", address="Kharadi, Pune", latitude=18.5523, longitude=73.9340
+        )
+        self.wagholi = Location.objects.create(
+            name="wagholi depot", address="Wagholi, Pune", latitude=18.5793, longitude=73.9787
+        )
+        self.mumbai = Location.objects.create(
+            name="mumbai depot", address="Mumbai", latitude=19.0760, longitude=72.8777
+        )
+
+    def test_nearest(self):
+        response = self.client.get(reverse('nearby_locations'), {'lat': 18.5293, 'lng': 73.9149, 'k': 2})
+        self.assertEqual(response.status_code, 200)
+        locations = response.json()['data']['locations']
+        self.assertEqual([location['id'] for location in locations], [self.kharadi.pk, self.wagholi.pk])
+        self.assertLess(locations[0]['distance_km'], locations[1]['distance_km'])
+
+    def test_within_radius(self):
+        response = self.client.get(reverse('nearby_locations'), {'lat': 18.5293, 'lng': 73.9149, 'radius_km': 5})
+        locations = response.json()['data']['locations']
+        self.assertEqual([location['id'] for location in locations], [self.kharadi.pk])
+
+    def test_bulk(self):
+        response = self.client.post(reverse('nearby_locations'), {
+            'points': [
+                {'latitude': 18.5293, 'longitude': 73.9149},
+                {'latitude': 19.07, 'longitude': 72.88}
+            ],
+            'k': 1
+        }, content_type='application/json')
+        results = response.json()['data']['results']
+        self.assertEqual(results[0]['locations'][0]['id'], self.kharadi.pk)
+        self.assertEqual(results[1]['locations'][0]['id'], self.mumbai.pk)
+
+    def test_invalid_coordinates(self):
+        response = self.client.get(reverse('nearby_locations'), {'lat': 'north', 'lng': 73.9})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error']['code'], "INVALID_PARAMETERS")
+
+
+class OptimizeRouteViewTest(TestCase):
+
+    def setUp(self):
+        # Depot at 0 km, stops at 3 km, 1 km and 2 km north along one road
+        self.depot = Location.objects.create(name="depot", address="Depot", latitude=18.0, longitude=73.0)
+        Location.objects.create(name="stop three", address="Stop Three", latitude=18.03, longitude=73.0)
+        Location.objects.create(name="stop one", address="Stop One", latitude=18.01, longitude=73.0)
+        Location.objects.create(name="stop two", address="Stop Two", latitude=18.02, longitude=73.0)
+
+    @staticmethod
+    def fake_matrix(origins, destinations, deadline=None):
+        return [[round(abs(a_lat - b_lat) * 100, 3) for b_lat, _ in destinations] for a_lat, _ in origins]
+
+    @patch('distance.services.LocationService.calculate_distance_matrix')
+    def test_optimize_route(self, mock_matrix):
+        mock_matrix.side_effect = self.fake_matrix
+        response = self.client.post(reverse('optimize_route'), {
+            'stops': ['Depot', 'Stop Three', 'Stop One', 'Stop Two']
+        }, content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual([stop['index'] for stop in data['stops']], [0, 2, 3, 1])
+        self.assertEqual(data['route']['distance']['value'], 3.0)
+        self.assertEqual(len(data['legs']), 3)
+        # Fetched distances are recorded and reused by the next request
+        self.assertEqual(DistanceRecord.objects.count(), 12)
+        mock_matrix.reset_mock()
+        self.client.post(reverse('optimize_route'), {
+            'stops': ['Depot', 'Stop Three', 'Stop One', 'Stop Two']
+        }, content_type='application/json')
+        mock_matrix.assert_not_called()
+
+    def test_optimize_route_invalid_body(self):
+        response = self.client.post(reverse('optimize_route'), {'stops': ['Depot']},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error']['code'], "INVALID_PARAMETERS")
+
+
+class AutocompleteViewTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.quiet = Location.objects.create(
+            name="kharadi bypass", address="Kharadi Bypass, Pune", latitude=18.55, longitude=73.94
+        )
+        self.busy = Location.objects.create(
+            name="Kharadi Main Rd", address="Kharadi Main Rd, Pune", latitude=18.53, longitude=73.91
+        )
+        Location.objects.create(name="wagholi", address="Wagholi, Pune", latitude=18.58, longitude=73.98)
+        tracker = UsageTracker()
+        tracker.record_request(cache_hit=False, pair=(self.busy.pk, self.quiet.pk))
+        tracker.record_request(cache_hit=False, pair=(self.busy.pk, self.busy.pk))
+        tracker.flush()
+
+    def test_prefix_ranked_by_popularity(self):
+        response = self.client.get(reverse('autocomplete_locations'), {'q': 'KHAR'})
+        self.assertEqual(response.status_code, 200)
+        suggestions = response.json()['data']['suggestions']
+        self.assertEqual([suggestion['id'] for suggestion in suggestions], [self.busy.pk, self.quiet.pk])
+
+    def test_limit(self):
+        response = self.client.get(reverse('autocomplete_locations'), {'q': 'kh', 'limit': 1})
+        self.assertEqual(len(response.json()['data']['suggestions']), 1)
+
+    def test_short_prefix_returns_nothing(self):
+        response = self.client.get(reverse('autocomplete_locations'), {'q': 'k'})
+        self.assertEqual(response.json()['data']['suggestions'], [])
+
+    def test_missing_prefix(self):
+        response = self.client.get(reverse('autocomplete_locations'))
+        self.assertEqual(response.status_code, 400)
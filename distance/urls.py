@@ -3,4 +3,10 @@ from . import views
 
 urlpatterns = [
     path('calculate-distance/', views.calculate_distance, name='calculate_distance'),
+    path('locations/nearby/', views.nearby_locations, name='nearby_locations'),
+    path('locations/autocomplete/', views.autocomplete_locations, name='autocomplete_locations'),
+    path('route/optimize/', views.optimize_route_view, name='optimize_route'),
+    path('stats/top-pairs/', views.stats_top_pairs, name='stats_top_pairs'),
+    path('stats/top-locations/', views.stats_top_locations, name='stats_top_locations'),
+    path('stats/usage/', views.stats_usage, name='stats_usage'),
 ]
\ No newline at end of file
@@ -1,13 +1,22 @@
-from django.db.models import Q
+import json
+import time
+
 from django.http import JsonResponse
-from django.views.decorators.http import require_GET
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_http_methods
 
-from .models import Location
-from .services import LocationService, DistanceService
+from .analytics import tracker as usage
+from .geo import haversine_km
+from .optimize import optimize_route
+from .providers import get_provider
+from . import startup
+from .resilience import Deadline
+from .services import (
+    ApproxDistanceService, AutocompleteService, DistanceService, NearbyService, UsageStatsService
+)
 from datetime import datetime
+from django.conf import settings
 from django.core.cache import cache
-from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
-from django.contrib.postgres.search import TrigramSimilarity
 
 def sanitize_input(input_str):
     """
@@ -15,6 +24,87 @@ def sanitize_input(input_str):
     """
     return input_str.strip().lower()
 
+
+def error_response(code, message, status=400):
+    return JsonResponse({
+        "status": "error",
+        "error": {
+            "code": code,
+            "message": message
+        }
+    }, status=status)
+
+
+def build_distance_result(start_location, end_location, distance_km, service):
+    # Calculate estimated travel time (3 minutes per kilometer)
+    estimated_time_minutes = distance_km * 3
+
+    return {
+        "status": "success",
+        "data": {
+            "start_location": {
+                "formatted_address": start_location.address,
+                "coordinates": start_location.coordinates.as_dict()
+            },
+            "end_location": {
+                "formatted_address": end_location.address,
+                "coordinates": end_location.coordinates.as_dict()
+            },
+            "route": {
+                "distance": {
+                    "value": distance_km,
+                    "unit": "kilometers"
+                },
+                "estimated_time": {
+                    "value": estimated_time_minutes,
+                    "unit": "minutes"
+                }
+            }
+        },
+        "metadata": {
+            "calculated_at": datetime.utcnow().isoformat() + "Z",
+            "service": service
+        }
+    }
+
+
+def cache_result(cache_key, result, start_location, end_location, timeout):
+    cache.set(cache_key, {
+        "result": result,
+        "pair": (start_location.pk, end_location.pk)
+    }, timeout=timeout)
+
+
+def distance_cache_key(start_address_sanitized, end_address_sanitized, provider, approx):
+    # Construct the cache key using sanitized addresses
+    cache_key = f"{start_address_sanitized}_{end_address_sanitized}"
+    if provider.name != 'google':
+        cache_key = f"{cache_key}_{provider.name}"
+    if approx:
+        cache_key = f"{cache_key}_approx"
+    return cache_key
+
+
+def cached_distance(request):
+    """
+    The cached entry answering a calculate_distance ``request``, or None.
+    The lookup is done once per request, so admission control can check for
+    a cache hit without costing the view a second round trip.
+    """
+    if not hasattr(request, '_cached_distance'):
+        start_address = request.GET.get('start')
+        end_address = request.GET.get('end')
+        provider = get_provider(request.GET.get('provider'))
+        cached = None
+        if start_address and end_address and provider is not None:
+            approx = request.GET.get('approx', '').lower() in ('true', '1')
+            cached = cache.get(distance_cache_key(
+                sanitize_input(start_address), sanitize_input(end_address), provider, approx
+            ))
+        request._cached_distance = cached if cached and "result" in cached else None
+    return request._cached_distance
+
+
 @require_GET
 def calculate_distance(request):
     start_address = request.GET.get('start')
@@ -29,40 +119,41 @@ def calculate_distance(request):
             }
         }, status=400)
 
+    provider = get_provider(request.GET.get('provider'))
+    if provider is None:
+        return JsonResponse({
+            "status": "error",
+            "error": {
+                "code": "INVALID_PARAMETERS",
+                "message": "Unknown distance provider."
+            }
+        }, status=400)
+
     # sanitize inputs
     start_address_sanitized = sanitize_input(start_address)
     end_address_sanitized = sanitize_input(end_address)
-
-    # Construct the cache key using sanitized addresses
-    cache_key = f"{start_address_sanitized}_{end_address_sanitized}"
+    approx = request.GET.get('approx', '').lower() in ('true', '1')
+    cache_key = distance_cache_key(start_address_sanitized, end_address_sanitized, provider, approx)
     # cache.delete(cache_key)
 
-    # Check if the result is already cached
-    cached_result = cache.get(cache_key)
-    if cached_result:
-        return JsonResponse(cached_result, status=200)
+    # Check if the result is already cached; entries carry the location pair
+    # alongside the response so hits can be counted per pair
+    cached = cached_distance(request)
+    if cached:
+        usage.record_request(cache_hit=True, pair=cached["pair"])
+        return JsonResponse(cached["result"], status=200)
 
-    # Full-text search for start and end locations
-    start_search_query = SearchQuery(start_address_sanitized)
-    end_search_query = SearchQuery(end_address_sanitized)
-    start_search_vector = SearchVector('name', weight='A') + SearchVector('address', weight='B')
-    end_search_vector = SearchVector('name', weight='A') + SearchVector('address', weight='B')
+    # Full-text and trigram search for start and end locations
+    start_location = DistanceService.find_location(start_address_sanitized)
+    end_location = DistanceService.find_location(end_address_sanitized)
 
-    # Use Trigram Similarity for more nuanced matching
-    start_location = Location.objects.annotate(
-        rank=SearchRank(start_search_vector, start_search_query),
-        similarity=TrigramSimilarity('name', start_address_sanitized) + TrigramSimilarity('address', start_address_sanitized)
-    ).filter(similarity__gt=0.3).order_by('-similarity', '-rank').first()
-
-    end_location = Location.objects.annotate(
-        rank=SearchRank(end_search_vector, end_search_query),
-        similarity=TrigramSimilarity('name', end_address_sanitized) + TrigramSimilarity('address', end_address_sanitized)
-    ).filter(similarity__gt=0.3).order_by('-similarity', '-rank').first()
+    # All upstream calls for this request share one time budget
+    deadline = Deadline()
 
     # Geocode the start and end addresses if not found in the database
     if not start_location:
-        start_formatted_address, start_lat, start_lng = LocationService.geocode_address(start_address_sanitized)
-        if not start_formatted_address:
+        start_location = DistanceService.geocode_location(start_address_sanitized, deadline=deadline)
+        if not start_location:
             return JsonResponse({
                 "status": "error",
                 "error": {
@@ -70,13 +161,10 @@ def calculate_distance(request):
                     "message": "Could not geocode the start address."
                 }
             }, status=400)
-        start_location = DistanceService.get_or_create_location(
-            start_address_sanitized, start_formatted_address, start_lat, start_lng
-        )
 
     if not end_location:
-        end_formatted_address, end_lat, end_lng = LocationService.geocode_address(end_address_sanitized)
-        if not end_formatted_address:
+        end_location = DistanceService.geocode_location(end_address_sanitized, deadline=deadline)
+        if not end_location:
             return JsonResponse({
                 "status": "error",
                 "error": {
@@ -84,12 +172,34 @@ def calculate_distance(request):
                     "message": "Could not geocode the end address."
                 }
             }, status=400)
-        end_location = DistanceService.get_or_create_location(
-            end_address_sanitized, end_formatted_address, end_lat, end_lng
-        )
+
+    # Coarse answers from learned cell-pair ratios, exact computation otherwise
+    if approx:
+        estimate = ApproxDistanceService.estimate(start_location, end_location)
+        if estimate is not None:
+            distance_km, error_bound_km = estimate
+            result = build_distance_result(
+                start_location, end_location, distance_km, "Geohash cell-pair estimate"
+            )
+            result["data"]["route"]["distance"].update(approximate=True, error_bound=error_bound_km)
+            cache_result(cache_key, result, start_location, end_location, timeout=3600)
+            usage.record_request(cache_hit=False, pair=(start_location.pk, end_location.pk))
+            return JsonResponse(result, status=200)
 
     # Calculate the distance between the start and end locations
-    distance_km = LocationService.calculate_distance(start_location.latitude, start_location.longitude, end_location.latitude, end_location.longitude)
+    distance_km = provider.distance(start_location, end_location, deadline=deadline)
+    service = provider.service
+    estimated = False
+    cache_timeout = 3600
+
+    # Degrade to a straight-line estimate when the upstream is unavailable
+    if distance_km is None and settings.MAPS_FALLBACK_MODE == 'straight_line':
+        distance_km = round(haversine_km(
+            *start_location.coordinates, *end_location.coordinates
+        ) * settings.MAPS_FALLBACK_ROAD_FACTOR, 3)
+        service = "Straight-line estimate"
+        estimated = True
+        cache_timeout = settings.MAPS_FALLBACK_CACHE_TIMEOUT
 
     # Check if distance calculation was successful
     if distance_km is None:
@@ -101,47 +211,239 @@ def calculate_distance(request):
             }
         }, status=400)
 
-    # Save the distance record in the database
-    DistanceService.save_distance_record(start_location, end_location, distance_km)
+    # Save the distance record in the database; estimates and local routing results are not recorded
+    if not estimated and provider.records_distances:
+        DistanceService.save_distance_record(start_location, end_location, distance_km)
 
-    # Calculate estimated travel time (3 minutes per kilometer)
-    estimated_time_minutes = distance_km * 3
+    result = build_distance_result(start_location, end_location, distance_km, service)
 
-    result = {
+    # Cache the result with a timeout
+    cache_result(cache_key, result, start_location, end_location, timeout=cache_timeout)
+    usage.record_request(cache_hit=False, pair=(start_location.pk, end_location.pk))
+
+    return JsonResponse(result, status=200)
+
+
+def _nearby_query(lat, lng, k, radius_km):
+    lat, lng = float(lat), float(lng)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("Coordinates out of range.")
+    if radius_km is None:
+        matches = NearbyService.nearest(lat, lng, k, settings.NEARBY_MAX_RADIUS_KM)
+    else:
+        matches = NearbyService.within_radius(lat, lng, radius_km, limit=k)
+    return {
+        "point": {"latitude": lat, "longitude": lng},
+        "locations": [
+            {
+                "id": location.pk,
+                "name": location.name,
+                "formatted_address": location.address,
+                "coordinates": location.coordinates.as_dict(),
+                "distance_km": round(distance_km, 3)
+            }
+            for location, distance_km in matches
+        ]
+    }
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def nearby_locations(request):
+    """
+    The ``k`` closest known locations to a point, or those within
+    ``radius_km``. GET takes ``lat``/``lng``; POST takes a JSON body with a
+    ``points`` list of ``{"latitude", "longitude"}`` for bulk queries.
+    """
+    params = request.GET
+    if request.method == "POST":
+        try:
+            params = json.loads(request.body)
+            points = [(point["latitude"], point["longitude"]) for point in params["points"]]
+        except (ValueError, KeyError, TypeError):
+            return error_response("INVALID_PARAMETERS", "Please provide a JSON body with a list of points.")
+        if len(points) > settings.NEARBY_MAX_BULK_POINTS:
+            return error_response(
+                "INVALID_PARAMETERS", f"At most {settings.NEARBY_MAX_BULK_POINTS} points per request."
+            )
+    else:
+        points = [(params.get("lat"), params.get("lng"))]
+
+    try:
+        k = min(int(params.get("k", 10)), settings.NEARBY_MAX_RESULTS)
+        radius_km = params.get("radius_km")
+        if radius_km is not None:
+            radius_km = min(float(radius_km), settings.NEARBY_MAX_RADIUS_KM)
+        if k < 1 or (radius_km is not None and radius_km <= 0):
+            raise ValueError
+        results = [_nearby_query(lat, lng, k, radius_km) for lat, lng in points]
+    except (ValueError, TypeError):
+        return error_response(
+            "INVALID_PARAMETERS", "Please provide valid coordinates, a positive k and radius_km."
+        )
+
+    data = {"results": results} if request.method == "POST" else results[0]
+    return JsonResponse({"status": "success", "data": data}, status=200)
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def optimize_route_view(request):
+    """
+    Order a list of stops to minimise total distance. Takes a JSON body with
+    ``stops`` (addresses, the first one is the start), optional
+    ``round_trip`` and ``provider``; returns the ordered stops and legs.
+    """
+    try:
+        body = json.loads(request.body)
+        if not isinstance(body["stops"], list):
+            raise TypeError
+        stops = [sanitize_input(stop) for stop in body["stops"]]
+        round_trip = bool(body.get("round_trip", False))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return error_response("INVALID_PARAMETERS", "Please provide a JSON body with a list of stops.")
+    if not 2 <= len(stops) <= settings.ROUTE_MAX_STOPS or not all(stops):
+        return error_response(
+            "INVALID_PARAMETERS", f"Please provide between 2 and {settings.ROUTE_MAX_STOPS} non-empty stops."
+        )
+
+    provider = get_provider(body.get("provider"))
+    if provider is None:
+        return error_response("INVALID_PARAMETERS", "Unknown distance provider.")
+
+    deadline = Deadline(settings.ROUTE_REQUEST_DEADLINE)
+
+    # Resolve every distinct stop from the database first, then geocode the rest
+    locations = {stop: DistanceService.find_location(stop) for stop in stops}
+    for stop, location in locations.items():
+        if location is None:
+            locations[stop] = DistanceService.geocode_location(stop, deadline=deadline)
+            if locations[stop] is None:
+                return error_response("GEOCODING_FAILED", f"Could not geocode the stop '{stop}'.")
+
+    stop_locations = [locations[stop] for stop in stops]
+    matrix = provider.matrix(stop_locations, deadline=deadline)
+    if any(distance_km is None for row in matrix for distance_km in row):
+        return error_response(
+            "DISTANCE_CALCULATION_FAILED", "Could not calculate distances between all of the provided stops."
+        )
+
+    started = time.monotonic()
+    order, total_km = optimize_route(matrix, round_trip=round_trip, time_budget=settings.ROUTE_TIME_BUDGET)
+    optimization_ms = (time.monotonic() - started) * 1000
+
+    def stop_data(index):
+        location = stop_locations[index]
+        return {
+            "index": index,
+            "formatted_address": location.address,
+            "coordinates": location.coordinates.as_dict()
+        }
+
+    return JsonResponse({
         "status": "success",
         "data": {
-            "start_location": {
-                "formatted_address": start_location.address,
-                "coordinates": {
-                    "latitude": start_location.latitude,
-                    "longitude": start_location.longitude
+            "stops": [stop_data(index) for index in order],
+            "legs": [
+                {
+                    "from": start,
+                    "to": end,
+                    "distance": {"value": round(matrix[start][end], 3), "unit": "kilometers"}
                 }
-            },
-            "end_location": {
-                "formatted_address": end_location.address,
-                "coordinates": {
-                    "latitude": end_location.latitude,
-                    "longitude": end_location.longitude
-                }
-            },
+                for start, end in zip(order, order[1:])
+            ],
             "route": {
                 "distance": {
-                    "value": distance_km,
+                    "value": round(total_km, 3),
                     "unit": "kilometers"
                 },
                 "estimated_time": {
-                    "value": estimated_time_minutes,
+                    "value": round(total_km * 3, 3),
                     "unit": "minutes"
                 }
             }
         },
         "metadata": {
             "calculated_at": datetime.utcnow().isoformat() + "Z",
-            "service": "Google Maps API"
+            "service": provider.service,
+            "optimization_ms": round(optimization_ms, 1)
         }
-    }
+    }, status=200)
 
-    # Cache the result with a timeout
-    cache.set(cache_key, result, timeout=3600)
 
-    return JsonResponse(result, status=200)
+@require_GET
+def autocomplete_locations(request):
+    """Type-ahead suggestions for known locations whose name starts with ``q``."""
+    prefix = request.GET.get("q")
+    if prefix is None:
+        return error_response("INVALID_PARAMETERS", "Please provide a search prefix.")
+    try:
+        limit = min(int(request.GET.get("limit", 5)), settings.AUTOCOMPLETE_MAX_LIMIT)
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return error_response("INVALID_PARAMETERS", "Please provide a positive limit.")
+
+    suggestions = []
+    if len(prefix.strip()) >= settings.AUTOCOMPLETE_MIN_LENGTH:
+        suggestions = AutocompleteService.suggest(prefix, limit)
+    return JsonResponse({"status": "success", "data": {"suggestions": suggestions}}, status=200)
+
+
+def _stats_limit(request):
+    limit = int(request.GET.get("limit", 10))
+    if limit < 1:
+        raise ValueError
+    return min(limit, settings.STATS_MAX_LIMIT)
+
+
+@require_GET
+def stats_top_pairs(request):
+    """Most requested (start, end) location pairs."""
+    try:
+        limit = _stats_limit(request)
+    except ValueError:
+        return error_response("INVALID_PARAMETERS", "Please provide a positive limit.")
+    return JsonResponse({"status": "success", "data": {"pairs": UsageStatsService.top_pairs(limit)}}, status=200)
+
+
+@require_GET
+def stats_top_locations(request):
+    """Most requested locations, as start or end of a route."""
+    try:
+        limit = _stats_limit(request)
+    except ValueError:
+        return error_response("INVALID_PARAMETERS", "Please provide a positive limit.")
+    return JsonResponse(
+        {"status": "success", "data": {"locations": UsageStatsService.top_locations(limit)}}, status=200
+    )
+
+
+@require_GET
+def stats_usage(request):
+    """Daily requests, cache hits/misses and upstream calls for the last ``days`` days."""
+    try:
+        days = min(int(request.GET.get("days", 30)), settings.STATS_MAX_DAYS)
+        if days < 1:
+            raise ValueError
+    except ValueError:
+        return error_response("INVALID_PARAMETERS", "Please provide a positive number of days.")
+    return JsonResponse({"status": "success", "data": {"days": UsageStatsService.daily(days)}}, status=200)
+
+
+@require_GET
+def healthz(request):
+    """Liveness: the worker answers. Includes its startup timings."""
+    return JsonResponse({
+        "status": "success",
+        "data": {"ready": startup.state["ready"], "startup_timings": startup.timings}
+    }, status=200)
+
+
+@require_GET
+def readyz(request):
+    """Readiness: 200 once this worker has warmed up, 503 until then."""
+    if startup.state["ready"]:
+        return JsonResponse({"status": "success", "data": {"ready": True}}, status=200)
+    startup.warmup_in_background()
+    return error_response("NOT_READY", startup.state["error"] or "Warming up.", status=503)
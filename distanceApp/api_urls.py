@@ -0,0 +1,9 @@
+"""
+URL configuration for the lean /api/ pipeline (see distanceApp/handlers.py).
+"""
+
+from django.urls import path, include
+
+urlpatterns = [
+    path('api/', include('distance.urls')),
+]
@@ -0,0 +1,58 @@
+"""
+Lean WSGI pipeline for the JSON API.
+
+``/api/`` requests are stateless, so they are served by ``ApiWSGIHandler``
+with the short ``API_MIDDLEWARE`` chain and ``API_URLCONF`` (no sessions,
+auth, CSRF, messages or admin URL patterns). Every other path, including
+``/admin/``, keeps the full ``MIDDLEWARE`` stack and ``ROOT_URLCONF``.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+
+class ApiWSGIHandler(WSGIHandler):
+
+    def load_middleware(self, is_async=False):
+        """Like ``BaseHandler.load_middleware``, sync only, from ``settings.API_MIDDLEWARE``."""
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        handler = convert_exception_to_response(self._get_response)
+        for middleware_path in reversed(settings.API_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            try:
+                mw_instance = middleware(handler)
+            except MiddlewareNotUsed:
+                continue
+            if mw_instance is None:
+                raise ImproperlyConfigured(f"Middleware factory {middleware_path} returned None.")
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(0, mw_instance.process_view)
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(mw_instance.process_template_response)
+            if hasattr(mw_instance, 'process_exception'):
+                self._exception_middleware.append(mw_instance.process_exception)
+            handler = convert_exception_to_response(mw_instance)
+        self._middleware_chain = handler
+
+    def get_response(self, request):
+        request.urlconf = settings.API_URLCONF
+        return super().get_response(request)
+
+
+class PathDispatcher:
+    """Send requests under ``API_PATH_PREFIX`` to the API handler, the rest to ``default``."""
+
+    def __init__(self, default, api):
+        self.default = default
+        self.api = api
+        self.prefix = settings.API_PATH_PREFIX
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO', '').startswith(self.prefix):
+            return self.api(environ, start_response)
+        return self.default(environ, start_response)
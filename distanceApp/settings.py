@@ -43,10 +43,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # OpClass index expressions, pg_trgm lookups
     'distance'
 ]
 
 MIDDLEWARE = [
+    'distance.middleware.ApiKeyMiddleware',
+    'distance.middleware.AdmissionControlMiddleware',
+    'distance.middleware.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +62,20 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'distanceApp.urls'
 
+# Lean pipeline for the stateless JSON API (see distanceApp/handlers.py):
+# requests under API_PATH_PREFIX skip sessions, auth, CSRF and messages and
+# resolve against API_URLCONF, which has no admin patterns.
+API_FAST_PATH = secrets.get('API_FAST_PATH', True)
+API_PATH_PREFIX = '/api/'
+API_URLCONF = 'distanceApp.api_urls'
+API_MIDDLEWARE = [
+    'distance.middleware.ApiKeyMiddleware',
+    'distance.middleware.AdmissionControlMiddleware',
+    'distance.middleware.ReplicaPinningMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',  # APPEND_SLASH redirects, as on the full stack
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -90,6 +108,16 @@ WSGI_APPLICATION = 'distanceApp.wsgi.application'
 # Determine if running in Docker
 DOCKER_ENV = os.getenv('DOCKER_ENV', 'False').lower() in ('true', '1', 't')
 
+# Running behind PgBouncer in transaction mode: server-side cursors and
+# session-level prepared statements do not survive across transactions there.
+DATABASE_PGBOUNCER = bool(secrets.get('DATABASE_PGBOUNCER', False))
+
+# Server-side prepared statements for the fixed-shape location lookup and
+# distance record insert (see distance/db.py). Ignored behind PgBouncer.
+DATABASE_PREPARED_STATEMENTS = (
+    bool(secrets.get('DATABASE_PREPARED_STATEMENTS', False)) and not DATABASE_PGBOUNCER
+)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -99,9 +127,35 @@ DATABASES = {
         'HOST': secrets.get('DATABASE_HOST'),
         'HOST': 'db' if DOCKER_ENV else secrets.get('DATABASE_HOST'),
         'PORT': secrets.get('DATABASE_PORT'),
+        # Keep one connection open per worker instead of reconnecting on
+        # every request; health checks drop connections that went stale.
+        'CONN_MAX_AGE': secrets.get('DATABASE_CONN_MAX_AGE', 600),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': DATABASE_PGBOUNCER,
+        'OPTIONS': {
+            'connect_timeout': secrets.get('DATABASE_CONNECT_TIMEOUT', 5),
+        },
     }
 }
 
+# Read replicas: location searches and other reads go to a healthy replica,
+# writes (and reads after a write in the same request) go to 'default'.
+DATABASE_REPLICAS = []
+for index, replica_host in enumerate(secrets.get('DATABASE_REPLICA_HOSTS', [])):
+    alias = f'replica{index}'
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# Seconds a replica may lag behind the primary before reads fall back to it.
+DATABASE_REPLICA_MAX_LAG = secrets.get('DATABASE_REPLICA_MAX_LAG', 5)
+DATABASE_REPLICA_CHECK_INTERVAL = secrets.get('DATABASE_REPLICA_CHECK_INTERVAL', 10)
+
+DATABASE_ROUTERS = ['distance.routers.ReplicaRouter'] if DATABASE_REPLICAS else []
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -146,6 +200,101 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 GOOGLE_MAPS_API_KEY = secrets.get("GOOGLE_MAPS_API_KEY")
 
+# Shared cache; required for circuit breaker state to be shared across workers.
+if secrets.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': secrets.get('REDIS_URL'),
+        }
+    }
+
+# Upstream Google Maps calls (see distance/resilience.py)
+MAPS_REQUEST_DEADLINE = secrets.get('MAPS_REQUEST_DEADLINE', 10)  # seconds per API request
+MAPS_REQUEST_TIMEOUT = secrets.get('MAPS_REQUEST_TIMEOUT', 5)  # seconds per upstream call
+MAPS_DISTANCE_RESERVE = secrets.get('MAPS_DISTANCE_RESERVE', 2)  # seconds kept for the distance call
+MAPS_HEDGE_AFTER = secrets.get('MAPS_HEDGE_AFTER')  # seconds before a hedged retry, None disables
+MAPS_BREAKER_FAILURE_THRESHOLD = secrets.get('MAPS_BREAKER_FAILURE_THRESHOLD', 5)
+MAPS_BREAKER_RESET_TIMEOUT = secrets.get('MAPS_BREAKER_RESET_TIMEOUT', 30)
+
+# `manage.py geocode_locations` defaults: keep the batch job's share of the
+# geocoding quota well below what live traffic needs.
+GEOCODE_BULK_QPS = secrets.get('GEOCODE_BULK_QPS', 5)
+GEOCODE_BULK_WORKERS = secrets.get('GEOCODE_BULK_WORKERS', 4)
+
+# Distance provider used when a request does not pass ?provider=
+# ('google' or 'local'); see distance/providers.py.
+DISTANCE_PROVIDER = secrets.get('DISTANCE_PROVIDER', 'google')
+
+# Road graph file for the local routing provider (see distance/routing.py)
+# and how far a coordinate may be from the nearest graph node.
+ROUTING_GRAPH_PATH = secrets.get('ROUTING_GRAPH_PATH')
+ROUTING_MAX_SNAP_KM = secrets.get('ROUTING_MAX_SNAP_KM', 1.0)
+
+# Memory-mapped location snapshot shared by all workers on a host, built by
+# `manage.py build_location_index`. Near-exact name matches are answered from
+# it; everything else falls back to the database similarity search.
+LOCATION_INDEX_PATH = secrets.get('LOCATION_INDEX_PATH')
+LOCATION_INDEX_MIN_SIMILARITY = secrets.get('LOCATION_INDEX_MIN_SIMILARITY', 0.8)
+LOCATION_INDEX_RELOAD_INTERVAL = secrets.get('LOCATION_INDEX_RELOAD_INTERVAL', 30)
+
+# /api/locations/nearby/ limits
+NEARBY_MAX_RESULTS = secrets.get('NEARBY_MAX_RESULTS', 100)
+NEARBY_MAX_RADIUS_KM = secrets.get('NEARBY_MAX_RADIUS_KM', 100)
+NEARBY_MAX_BULK_POINTS = secrets.get('NEARBY_MAX_BULK_POINTS', 500)
+
+# DistanceRecord is partitioned by month (`manage.py maintain_distance_records`,
+# run daily): partitions are created this many months ahead, and raw rows are
+# dropped a whole month at a time after the retention period (0 keeps them
+# forever). Daily per-pair rollups are kept.
+DISTANCE_RECORD_PARTITIONS_AHEAD = secrets.get('DISTANCE_RECORD_PARTITIONS_AHEAD', 3)
+DISTANCE_RECORD_RETENTION_MONTHS = secrets.get('DISTANCE_RECORD_RETENTION_MONTHS', 12)
+
+# Approximate distances (?approx=true) from ratios learned per geohash cell
+# pair by `manage.py rebuild_cell_distances`.
+APPROX_GEOHASH_PRECISION = secrets.get('APPROX_GEOHASH_PRECISION', 5)  # ~5 km cells
+APPROX_MIN_SAMPLES = secrets.get('APPROX_MIN_SAMPLES', 3)
+APPROX_MIN_STRAIGHT_KM = secrets.get('APPROX_MIN_STRAIGHT_KM', 0.5)
+
+# Usage counters (see distance/analytics.py) and /api/stats/ limits
+ANALYTICS_SKETCH_CAPACITY = secrets.get('ANALYTICS_SKETCH_CAPACITY', 1000)  # pairs/locations tracked per worker
+ANALYTICS_FLUSH_INTERVAL = secrets.get('ANALYTICS_FLUSH_INTERVAL', 60)  # seconds between merges into the DB
+STATS_MAX_LIMIT = secrets.get('STATS_MAX_LIMIT', 100)
+STATS_MAX_DAYS = secrets.get('STATS_MAX_DAYS', 366)
+
+# /api/locations/autocomplete/
+AUTOCOMPLETE_MIN_LENGTH = secrets.get('AUTOCOMPLETE_MIN_LENGTH', 2)
+AUTOCOMPLETE_MAX_LIMIT = secrets.get('AUTOCOMPLETE_MAX_LIMIT', 10)
+AUTOCOMPLETE_CACHE_TIMEOUT = secrets.get('AUTOCOMPLETE_CACHE_TIMEOUT', 60)
+
+# /api/route/optimize/ limits
+ROUTE_MAX_STOPS = secrets.get('ROUTE_MAX_STOPS', 150)
+ROUTE_TIME_BUDGET = secrets.get('ROUTE_TIME_BUDGET', 0.5)  # seconds spent improving the order
+ROUTE_REQUEST_DEADLINE = secrets.get('ROUTE_REQUEST_DEADLINE', 30)  # seconds for all upstream calls
+
+# 'fail' returns DISTANCE_CALCULATION_FAILED when the distance call fails,
+# 'straight_line' answers with the great-circle distance times a road factor.
+MAPS_FALLBACK_MODE = secrets.get('MAPS_FALLBACK_MODE', 'fail')
+MAPS_FALLBACK_ROAD_FACTOR = secrets.get('MAPS_FALLBACK_ROAD_FACTOR', 1.3)
+MAPS_FALLBACK_CACHE_TIMEOUT = secrets.get('MAPS_FALLBACK_CACHE_TIMEOUT', 60)
+
+# Admission control for upstream-bound views (see distance/admission.py).
+# API_KEYS maps X-API-Key values to a priority: 'high', 'normal' or 'low';
+# with API_KEY_REQUIRED, /api/ requests without one of them get a 401.
+API_KEYS = secrets.get('API_KEYS', {})
+API_KEY_REQUIRED = secrets.get('API_KEY_REQUIRED', False)
+ADMISSION_DEFAULT_PRIORITY = secrets.get('ADMISSION_DEFAULT_PRIORITY', 'normal')
+ADMISSION_CONTROLLED_VIEWS = secrets.get('ADMISSION_CONTROLLED_VIEWS', ['calculate_distance', 'optimize_route'])
+ADMISSION_MAX_IN_FLIGHT = secrets.get('ADMISSION_MAX_IN_FLIGHT', None)  # across all workers and hosts, None disables
+ADMISSION_IN_FLIGHT_TTL = secrets.get('ADMISSION_IN_FLIGHT_TTL', 300)  # seconds, recovers leaked slots
+ADMISSION_TARGET_DELAY = secrets.get('ADMISSION_TARGET_DELAY', 0.1)  # seconds of acceptable queue delay
+ADMISSION_INTERVAL = secrets.get('ADMISSION_INTERVAL', 1.0)  # seconds above target before shedding
+ADMISSION_RETRY_AFTER = secrets.get('ADMISSION_RETRY_AFTER', 1)  # seconds
+
+# Hottest location pairs whose cached responses each worker fills from
+# recorded distances during startup warmup (see distance/startup.py).
+STARTUP_WARM_PAIRS = secrets.get('STARTUP_WARM_PAIRS', 100)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -155,6 +304,10 @@ LOGGING = {
             'class': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'errors.log'),
         },
+        'console': {
+            'level': 'INFO',
+            'class': 'logging.StreamHandler',
+        },
     },
     'loggers': {
         'django': {
@@ -162,5 +315,11 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        # Startup step timings (see distance/startup.py)
+        'distance.startup': {
+            'handlers': ['console', 'file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     },
 }
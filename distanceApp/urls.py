@@ -18,7 +18,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from distance import views
+
 urlpatterns = [
+    path('healthz', views.healthz, name='healthz'),
+    path('readyz', views.readyz, name='readyz'),
     path('admin/', admin.site.urls),
     path('api/', include('distance.urls')),
 ]
\ No newline at end of file
@@ -2,15 +2,29 @@
 WSGI config for distanceApp project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+With API_FAST_PATH on, /api/ requests are served by the lean API pipeline
+(see distanceApp/handlers.py).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 """
 
 import os
+import time
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
+from distanceApp.handlers import ApiWSGIHandler, PathDispatcher
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'distanceApp.settings')
 
+started = time.monotonic()
 application = get_wsgi_application()
+
+from distance import startup  # noqa: E402  (needs the app registry)
+
+startup.timings['django_setup'] = round(time.monotonic() - started, 3)
+
+if settings.API_FAST_PATH:
+    application = PathDispatcher(application, ApiWSGIHandler())
@@ -0,0 +1,50 @@
+# gunicorn.conf.py
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+The app is imported once in the master (``preload_app``) and workers are
+forked from it, sharing its memory copy-on-write. Each worker then warms up
+(see distance/startup.py) before it accepts requests, and adds its pending
+usage counters to the database when it exits.
+"""
+import gc
+import os
+import time
+
+boot_started = time.monotonic()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+preload_app = True
+
+
+def when_ready(server):
+    """In the master, after the app is loaded and before any worker is forked."""
+    from django.db import connections
+
+    from distance import startup
+
+    startup.preload()
+    # Sockets must not be shared with the workers.
+    connections.close_all()
+    startup.timings['master_boot'] = round(time.monotonic() - boot_started, 3)
+    server.log.info("Master booted in %.3fs: %s", startup.timings['master_boot'], startup.timings)
+    # Keep the preloaded objects out of the collector, whose bookkeeping
+    # would otherwise dirty their pages in every worker.
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from distance import startup
+
+    started = time.monotonic()
+    ready = startup.warmup()
+    worker.log.info("Worker %s warmed up in %.3fs (ready: %s)", worker.pid, time.monotonic() - started, ready)
+
+
+def worker_exit(server, worker):
+    """In the worker, once it has stopped serving (shutdown, reload or max_requests)."""
+    from distance.analytics import tracker
+
+    # Counts gathered since the last periodic flush would be lost with the process.
+    tracker.flush()